@@ -0,0 +1,235 @@
+"""Агрегаты продаж: выручка по дням и по товарам.
+
+Документы sales_daily (ключ — дата YYYY-MM-DD) и sales_by_product (ключ — _key товара)
+обновляются приращениями при создании заказа и смене его статуса; rebuild_rollups
+пересчитывает их целиком одним COLLECT по orders. Отчёты читают только агрегаты.
+
+Полный пересчёт (например, после импорта заказов):
+    python -m app.analytics --rebuild
+"""
+import argparse
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from arango.database import StandardDatabase
+
+
+SALES_DAILY = "sales_daily"
+SALES_BY_PRODUCT = "sales_by_product"
+ROLLUP_COLLECTIONS = [SALES_DAILY, SALES_BY_PRODUCT]
+
+# Отменённые заказы в выручку не входят
+EXCLUDED_STATUSES = ["cancelled"]
+
+
+def counts_in_sales(order: dict) -> bool:
+    return order.get("status") not in EXCLUDED_STATUSES
+
+
+def product_key(product_id: Optional[str]) -> str:
+    """product_id в заказах бывает и ключом, и _id вида products/<key>"""
+    return str(product_id or "unknown").split("/")[-1]
+
+
+# Приращение агрегатов на один заказ; @sign = 1 добавляет заказ, -1 вычитает.
+# Фрагмент без RETURN, чтобы его можно было встроить в другой запрос (см. orders.create_order_query).
+# Выручку задаёт переменная rollup_revenue: в приращении — bind var, при создании заказа —
+# сумма, посчитанная по цене товара в том же запросе
+ROLLUP_UPSERT_AQL = """
+LET rollup_product = DOCUMENT("products", @rollup_product_key)
+LET rollup_day = FIRST(
+    UPSERT {_key: @rollup_day}
+        INSERT {_key: @rollup_day, day: @rollup_day, orders: @sign,
+                quantity: @sign * @rollup_quantity, revenue: @sign * rollup_revenue}
+        UPDATE {orders: OLD.orders + @sign, quantity: OLD.quantity + @sign * @rollup_quantity,
+                revenue: OLD.revenue + @sign * rollup_revenue}
+        IN sales_daily
+    RETURN NEW._key
+)
+LET rollup_by_product = FIRST(
+    UPSERT {_key: @rollup_product_key}
+        INSERT {_key: @rollup_product_key, product_id: @rollup_product_key,
+                product_name: rollup_product.name, material: rollup_product.material,
+                orders: @sign, quantity: @sign * @rollup_quantity, revenue: @sign * rollup_revenue}
+        UPDATE {orders: OLD.orders + @sign, quantity: OLD.quantity + @sign * @rollup_quantity,
+                revenue: OLD.revenue + @sign * rollup_revenue,
+                product_name: rollup_product.name || OLD.product_name,
+                material: rollup_product.material || OLD.material}
+        IN sales_by_product
+    RETURN NEW._key
+)
+"""
+
+
+def rollup_bind_vars(order: dict, sign: int) -> Dict[str, Any]:
+    return {
+        "sign": sign,
+        "rollup_day": str(order.get("created_at") or "")[:10] or "unknown",
+        "rollup_product_key": product_key(order.get("product_id")),
+        # Значения из формы редактора сущностей приходят строками
+        "rollup_quantity": _number(order.get("quantity")),
+        "rollup_revenue": _number(order.get("total_price")),
+    }
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def rollup_delta_query(order: dict, sign: int) -> Tuple[str, Dict[str, Any]]:
+    """AQL приращения агрегатов на один заказ"""
+    query = "LET rollup_revenue = @rollup_revenue" + ROLLUP_UPSERT_AQL + "RETURN [rollup_day, rollup_by_product]"
+    return query, rollup_bind_vars(order, sign)
+
+
+def status_change_deltas(old: dict, new: dict):
+    """Приращения при изменении заказа: старая версия вычитается, новая добавляется"""
+    deltas = []
+    if counts_in_sales(old):
+        deltas.append(rollup_delta_query(old, -1))
+    if counts_in_sales(new):
+        deltas.append(rollup_delta_query(new, 1))
+    return deltas
+
+
+# Пересчёт записывает агрегаты поверх существующих (UPSERT с меткой прогона @stamp),
+# а строки без этой метки — дни и товары, по которым заказов больше нет, — удаляет
+REBUILD_DAILY_AQL = """
+FOR o IN orders
+    FILTER o.status NOT IN @excluded
+    COLLECT day = SUBSTRING(o.created_at, 0, 10)
+    AGGREGATE orders = COUNT(1), quantity = SUM(TO_NUMBER(o.quantity)), revenue = SUM(TO_NUMBER(o.total_price))
+    LET key = day || "unknown"
+    UPSERT {_key: key}
+        INSERT {_key: key, day: key, orders, quantity, revenue, rebuilt: @stamp}
+        REPLACE {day: key, orders, quantity, revenue, rebuilt: @stamp}
+        IN sales_daily
+"""
+
+REBUILD_BY_PRODUCT_AQL = """
+FOR o IN orders
+    FILTER o.status NOT IN @excluded
+    COLLECT key = LAST(SPLIT(o.product_id || "unknown", "/"))
+    AGGREGATE orders = COUNT(1), quantity = SUM(TO_NUMBER(o.quantity)), revenue = SUM(TO_NUMBER(o.total_price))
+    LET p = DOCUMENT("products", key)
+    UPSERT {_key: key}
+        INSERT {_key: key, product_id: key, product_name: p.name, material: p.material,
+                orders, quantity, revenue, rebuilt: @stamp}
+        REPLACE {product_id: key, product_name: p.name, material: p.material,
+                 orders, quantity, revenue, rebuilt: @stamp}
+        IN sales_by_product
+"""
+
+REMOVE_STALE_ROLLUPS_AQL = "FOR r IN @@rollups FILTER r.rebuilt != @stamp REMOVE r IN @@rollups"
+
+
+def ensure_collections(db: StandardDatabase):
+    for name in ROLLUP_COLLECTIONS:
+        if not db.has_collection(name):
+            db.create_collection(name)
+
+
+def rebuild_rollups(db: StandardDatabase) -> dict:
+    """Полный пересчёт агрегатов по всем заказам.
+
+    Выполняется одной stream-транзакцией с эксклюзивной блокировкой агрегатов: приращения
+    (создание и правка заказа) и другие пересчёты ждут её завершения, а читатели до
+    фиксации видят прежние значения. Заказ, записанный до начала транзакции, попадает
+    в пересчёт, а его приращение — уже в агрегаты до пересчёта, поэтому дважды не учитывается.
+    """
+    started = time.perf_counter()
+    ensure_collections(db)
+    stamp = uuid.uuid4().hex
+    txn = db.begin_transaction(read=["orders", "products"], exclusive=ROLLUP_COLLECTIONS)
+    try:
+        txn.aql.execute(REBUILD_DAILY_AQL, bind_vars={"excluded": EXCLUDED_STATUSES, "stamp": stamp})
+        txn.aql.execute(REBUILD_BY_PRODUCT_AQL, bind_vars={"excluded": EXCLUDED_STATUSES, "stamp": stamp})
+        for name in ROLLUP_COLLECTIONS:
+            txn.aql.execute(REMOVE_STALE_ROLLUPS_AQL, bind_vars={"@rollups": name, "stamp": stamp})
+        txn.commit_transaction()
+    except Exception:
+        txn.abort_transaction()
+        raise
+    return {
+        "days": db.collection(SALES_DAILY).count(),
+        "products": db.collection(SALES_BY_PRODUCT).count(),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def update_order(db: StandardDatabase, document: dict) -> Optional[dict]:
+    """Правка заказа вместе с переносом его вклада в агрегатах — одной транзакцией.
+
+    Разделяемая блокировка агрегатов не даёт правке попасть между чтением заказов
+    и записью результата в rebuild_rollups. Возвращает заказ до правки или None,
+    если заказа нет.
+    """
+    txn = db.begin_transaction(read=["products"], write=["orders"] + ROLLUP_COLLECTIONS)
+    try:
+        previous = txn.collection("orders").get(document["_key"])
+        if previous is None:
+            txn.abort_transaction()
+            return None
+        txn.collection("orders").update(document, check_rev=False)
+        for query, bind_vars in status_change_deltas(previous, {**previous, **document}):
+            txn.aql.execute(query, bind_vars=bind_vars)
+        txn.commit_transaction()
+    except Exception:
+        txn.abort_transaction()
+        raise
+    return previous
+
+
+# Запросы страницы аналитики: каждый читает несколько сотен строк агрегатов
+DAILY_REPORT_AQL = """
+FOR d IN sales_daily
+    FILTER d.day >= @since
+    SORT d.day
+    RETURN d
+"""
+
+MONTHLY_REPORT_AQL = """
+FOR d IN sales_daily
+    COLLECT month = SUBSTRING(d.day, 0, 7)
+    AGGREGATE orders = SUM(d.orders), quantity = SUM(d.quantity), revenue = SUM(d.revenue)
+    SORT month DESC
+    LIMIT @limit
+    RETURN {month, orders, quantity, revenue}
+"""
+
+TOP_PRODUCTS_AQL = """
+FOR p IN sales_by_product
+    SORT p.revenue DESC
+    LIMIT @limit
+    RETURN p
+"""
+
+MATERIAL_REPORT_AQL = """
+FOR p IN sales_by_product
+    COLLECT material = p.material
+    AGGREGATE orders = SUM(p.orders), quantity = SUM(p.quantity), revenue = SUM(p.revenue)
+    SORT revenue DESC
+    RETURN {material, orders, quantity, revenue}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агрегаты продаж WindowShop")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать агрегаты по всем заказам")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from .db import get_db
+    result = rebuild_rollups(get_db())
+    print(f"Агрегаты пересчитаны: дней {result['days']}, товаров {result['products']}, "
+          f"{result['elapsed_ms']} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+
+# Конфигурация пула проверки паролей
+LOGIN_POOL_KIND = os.getenv("LOGIN_POOL_KIND", "thread")  # thread | process
+LOGIN_POOL_WORKERS = int(os.getenv("LOGIN_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+LOGIN_QUEUE_LIMIT = int(os.getenv("LOGIN_QUEUE_LIMIT", "32"))
+
+
+class LoginPoolSaturated(Exception):
+    """Все воркеры заняты и очередь проверки паролей заполнена"""
+
+
+def _checkpw(password: bytes, password_hash: bytes) -> bool:
+    # Функция верхнего уровня, чтобы её можно было передать в ProcessPoolExecutor
+    return bcrypt.checkpw(password, password_hash)
+
+
+class PasswordVerifier:
+    """Выполняет bcrypt.checkpw в отдельном пуле, не блокируя event loop"""
+
+    def __init__(self, workers: int, queue_limit: int, kind: str = "thread"):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.kind = kind
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Executor
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            # bcrypt отпускает GIL на время хэширования, поэтому потоков достаточно
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Одновременно допускаем не больше workers + queue_limit проверок
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._in_flight = 0
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise LoginPoolSaturated()
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, _checkpw, password.encode(), password_hash.encode()
+            )
+        finally:
+            self._in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_verifier = PasswordVerifier(LOGIN_POOL_WORKERS, LOGIN_QUEUE_LIMIT, LOGIN_POOL_KIND)
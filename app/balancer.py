@@ -0,0 +1,139 @@
+import itertools
+import threading
+import time
+from typing import List, Optional, Set
+
+from arango.http import DefaultHTTPClient
+from arango.resolver import HostResolver
+from requests import ConnectionError
+
+from .metrics import observe_db_request
+
+
+class CoordinatorPool:
+    """Состояние координаторов ArangoDB: текущая нагрузка, ошибки и исключённые хосты"""
+
+    def __init__(
+        self,
+        hosts: List[str],
+        strategy: str = "round_robin",
+        max_per_host: int = 0,
+        acquire_timeout: Optional[float] = None,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+    ):
+        self.hosts = hosts
+        self.strategy = strategy
+        self.max_per_host = max_per_host
+        self.acquire_timeout = acquire_timeout
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._in_flight = [0] * len(hosts)
+        self._requests = [0] * len(hosts)
+        self._failures = [0] * len(hosts)
+        self._ejected_until = [0.0] * len(hosts)
+        self._round_robin = itertools.count()
+        self._cond = threading.Condition()
+
+    def pick(self, exclude: Optional[Set[int]] = None) -> int:
+        """Выбирает координатор для следующего запроса"""
+        exclude = exclude or set()
+        with self._cond:
+            now = time.monotonic()
+            candidates = [
+                i for i in range(len(self.hosts))
+                if i not in exclude and self._ejected_until[i] <= now
+            ]
+            if not candidates:
+                # Все живые хосты уже пробовали или исключены — пробуем любые оставшиеся
+                candidates = [i for i in range(len(self.hosts)) if i not in exclude] or list(range(len(self.hosts)))
+
+            if self.strategy == "least_loaded":
+                return min(candidates, key=lambda i: (self._in_flight[i], self._requests[i]))
+            return candidates[next(self._round_robin) % len(candidates)]
+
+    def index_of(self, url: str) -> int:
+        for i, host in enumerate(self.hosts):
+            if url.startswith(host + "/"):
+                return i
+        raise ValueError(f"URL не принадлежит ни одному координатору: {url}")
+
+    def acquire(self, index: int):
+        """Занимает слот на хосте с учётом лимита одновременных соединений"""
+        with self._cond:
+            if self.max_per_host:
+                has_slot = self._cond.wait_for(
+                    lambda: self._in_flight[index] < self.max_per_host,
+                    timeout=self.acquire_timeout,
+                )
+                if not has_slot:
+                    # ConnectionError заставит python-arango попробовать другой координатор
+                    raise ConnectionError(f"Исчерпан лимит соединений к {self.hosts[index]}")
+            self._in_flight[index] += 1
+            self._requests[index] += 1
+
+    def release(self, index: int, ok: bool):
+        with self._cond:
+            self._in_flight[index] -= 1
+            if ok:
+                self._failures[index] = 0
+            else:
+                self._failures[index] += 1
+                if self._failures[index] >= self.max_failures:
+                    self._ejected_until[index] = time.monotonic() + self.eject_seconds
+                    print(f"[WARN] Координатор {self.hosts[index]} исключён на {self.eject_seconds} с")
+            self._cond.notify_all()
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "host": host,
+                    "in_flight": self._in_flight[i],
+                    "requests": self._requests[i],
+                    "failures": self._failures[i],
+                    "healthy": self._ejected_until[i] <= now,
+                }
+                for i, host in enumerate(self.hosts)
+            ]
+
+
+class BalancedHostResolver(HostResolver):
+    """Резолвер python-arango, делегирующий выбор хоста CoordinatorPool"""
+
+    def __init__(self, pool: CoordinatorPool, max_tries: Optional[int] = None):
+        super().__init__(len(pool.hosts), max_tries)
+        self._pool = pool
+
+    def get_host_index(self, indexes_to_filter: Optional[Set[int]] = None) -> int:
+        return self._pool.pick(indexes_to_filter)
+
+
+class BalancedHTTPClient(DefaultHTTPClient):
+    """HTTP-клиент с настраиваемым пулом соединений, учитывающий нагрузку и ошибки хостов"""
+
+    def __init__(self, pool: CoordinatorPool, keep_alive: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self._pool = pool
+        self._keep_alive = keep_alive
+
+    def create_session(self, host: str):
+        session = super().create_session(host)
+        if not self._keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def send_request(self, session, method, url, headers=None, params=None, data=None, auth=None):
+        index = self._pool.index_of(url)
+        self._pool.acquire(index)
+        ok = False
+        started = time.perf_counter()
+        try:
+            response = super().send_request(session, method, url, headers, params, data, auth)
+            # 503 отдаёт координатор, потерявший связь с кластером
+            ok = response.status_code != 503
+            return response
+        finally:
+            self._pool.release(index, ok)
+            observe_db_request(method, url, time.perf_counter() - started)
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+# Маркер отсутствия значения (None тоже может быть закэширован)
+_MISSING = object()
+
+
+def json_size(value: Any) -> int:
+    """Примерный объём значения в байтах — по его JSON-представлению"""
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class TTLCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей и счётчиками попаданий.
+
+    max_bytes дополнительно ограничивает суммарный объём записей (size передаётся в set),
+    cost — сколько секунд стоило получить значение: на попаданиях копится сэкономленное время.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, max_bytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        # Растёт при каждой очистке: значение, вычисленное до неё, в кэш уже не попадёт
+        self.generation = 0
+        self._bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at, _, cost = entry
+            if expires_at < time.monotonic():
+                # Запись устарела — удаляем и считаем промахом
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += cost
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0, cost: float = 0.0,
+            generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._remove(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, size, cost)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Удаляет все записи, для которых predicate(key, value) истинно"""
+        with self._lock:
+            stale = [key for key, entry in self._data.items() if predicate(key, entry[0])]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.generation += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "saved_db_ms": round(self.saved_seconds * 1000, 1),
+        }
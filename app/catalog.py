@@ -0,0 +1,294 @@
+import json
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+
+from .migrations import NGRAM_ANALYZER, NORM_ANALYZER, PRODUCT_SEARCH_VIEW
+from .pagination import SortKey, decode_cursor, encode_cursor, keyset_filter, next_cursor, sort_clause
+
+
+class ProductFilters(BaseModel):
+    name: Optional[str] = None
+    material: Optional[str] = None
+    color: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_width: Optional[float] = None
+    max_width: Optional[float] = None
+    min_height: Optional[float] = None
+    max_height: Optional[float] = None
+    in_stock: Optional[bool] = None
+    description : Optional[str] = None
+
+
+# Варианты сортировки каталога: только по проиндексированным полям,
+# _key добавляется последним для однозначного порядка при равных значениях
+CATALOG_SORTS: Dict[str, List[SortKey]] = {
+    "name": [("name", "ASC"), ("_key", "ASC")],
+    "price": [("price", "ASC"), ("_key", "ASC")],
+    "-price": [("price", "DESC"), ("_key", "DESC")],
+    "-created_at": [("created_at", "DESC"), ("_key", "DESC")],
+}
+# Сортировка по релевантности (BM25) доступна только при текстовом поиске;
+# страницы в ней отсчитываются смещением, т.к. оценка не индексируется
+RELEVANCE_SORT = "relevance"
+CATALOG_SORT_LABELS = {
+    RELEVANCE_SORT: "По релевантности",
+    "name": "По названию",
+    "price": "Сначала дешёвые",
+    "-price": "Сначала дорогие",
+    "-created_at": "Сначала новые",
+}
+DEFAULT_CATALOG_SORT = "name"
+
+# Запросы короче n-граммы ищутся через LIKE по нормализованному значению поля
+NGRAM_SIZE = 3
+
+
+def normalize_value(value: Optional[str]) -> Optional[str]:
+    """Нормализация для полей *_lc: без пробелов по краям и в нижнем регистре"""
+    if value is None:
+        return None
+    return str(value).strip().lower()
+
+
+def normalize_product(document: dict) -> dict:
+    """Проставляет нормализованные поля material_lc / color_lc, по которым строятся индексы"""
+    for field in ("material", "color"):
+        if field in document:
+            document[f"{field}_lc"] = normalize_value(document[field])
+    return document
+
+
+class FilterSpec(NamedTuple):
+    """Описание фильтра: параметр ProductFilters -> условие AQL по полю документа"""
+    param: str
+    field: str
+    kind: str                      # equality | range | text
+    op: str = "=="
+    cast: Callable[[Any], Any] = lambda value: value
+
+
+# Порядок повторяет составные индексы: сначала равенства по нормализованным полям,
+# затем диапазоны — так условия ложатся на [material_lc, color_lc, price]
+PRODUCT_FILTER_SPECS: List[FilterSpec] = [
+    FilterSpec("material", "material_lc", "equality", cast=normalize_value),
+    FilterSpec("color", "color_lc", "equality", cast=normalize_value),
+    FilterSpec("in_stock", "in_stock", "equality", cast=bool),
+    FilterSpec("min_price", "price", "range", ">=", float),
+    FilterSpec("max_price", "price", "range", "<=", float),
+    FilterSpec("min_width", "width", "range", ">=", float),
+    FilterSpec("max_width", "width", "range", "<=", float),
+    FilterSpec("min_height", "height", "range", ">=", float),
+    FilterSpec("max_height", "height", "range", "<=", float),
+    FilterSpec("name", "name", "text", cast=normalize_value),
+    FilterSpec("description", "description", "text", cast=normalize_value),
+]
+
+
+class CompiledFilters(NamedTuple):
+    conditions: List[str]          # равенства и диапазоны в порядке PRODUCT_FILTER_SPECS
+    texts: Dict[str, str]          # поле -> нормализованная подстрока для поиска
+    bind_vars: Dict[str, Any]
+
+
+def compile_product_filters(filters: ProductFilters, var: str = "p") -> CompiledFilters:
+    """Переводит ProductFilters в условия AQL согласно PRODUCT_FILTER_SPECS"""
+    conditions = []
+    texts = {}
+    bind_vars = {}
+    for spec in PRODUCT_FILTER_SPECS:
+        value = getattr(filters, spec.param)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        value = spec.cast(value)
+        if spec.kind == "text":
+            texts[spec.field] = value
+            continue
+        conditions.append(f"{var}.{spec.field} {spec.op} @{spec.param}")
+        bind_vars[spec.param] = value
+    return CompiledFilters(conditions, texts, bind_vars)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_condition(var: str, field: str, value: str, bind_name: str) -> Tuple[str, Dict[str, Any]]:
+    """Условие SEARCH для подстроки value в поле field представления products_search"""
+    if len(value) >= NGRAM_SIZE:
+        # Все триграммы запроса должны встретиться в поле — выборка по инвертированному индексу
+        return (f"NGRAM_MATCH({var}.{field}, @{bind_name}, 1, '{NGRAM_ANALYZER}')",
+                {bind_name: value})
+    # Шаблон LIKE не анализируется: приводим его тем же анализатором, что и индексированные
+    # значения (регистр, ё/й без диакритики), иначе такие буквы в запросе не совпадут
+    return (f"ANALYZER(LIKE({var}.{field}, TOKENS(@{bind_name}, '{NORM_ANALYZER}')[0]), '{NORM_ANALYZER}')",
+            {bind_name: f"%{escape_like(value)}%"})
+
+
+def product_source(compiled: CompiledFilters, var: str = "p") -> Tuple[str, List[str], Dict[str, Any]]:
+    """FOR ... (и SEARCH) для выборки товаров плюс условия, которые остаются для FILTER.
+
+    Без текстового поиска — коллекция products, где равенства и диапазоны попадают
+    в составные persistent-индексы. С поиском — представление products_search:
+    подстрока ищется по n-граммам, остальные условия идут в тот же SEARCH,
+    а точное совпадение подстроки проверяется уже на найденных кандидатах.
+    """
+    bind_vars = dict(compiled.bind_vars)
+    if not compiled.texts:
+        return f"FOR {var} IN products", list(compiled.conditions), bind_vars
+
+    search_conditions = []
+    post_filters = []
+    for field, value in compiled.texts.items():
+        condition, search_vars = search_condition(var, field, value, f"{field}_search")
+        search_conditions.append(condition)
+        bind_vars.update(search_vars)
+        if len(value) >= NGRAM_SIZE:
+            # NGRAM_MATCH не учитывает порядок триграмм — отсекаем ложные срабатывания
+            post_filters.append(f"CONTAINS(LOWER({var}.{field}), @{field}_search)")
+    source = f"FOR {var} IN {PRODUCT_SEARCH_VIEW} SEARCH " + " AND ".join(search_conditions + compiled.conditions)
+    return source, post_filters, bind_vars
+
+
+def cursor_size(sort: str) -> int:
+    return 1 if sort == RELEVANCE_SORT else len(CATALOG_SORTS[sort])
+
+
+# Типы значений в токене страницы для полей сортировки; null допустим везде, кроме _key
+CURSOR_FIELD_TYPES: Dict[str, tuple] = {"name": (str,), "price": (int, float), "created_at": (str,), "_key": (str,)}
+
+
+def _valid_cursor_value(field: str, value: Any) -> bool:
+    if value is None:
+        return field != "_key"
+    return isinstance(value, CURSOR_FIELD_TYPES[field]) and not isinstance(value, bool)
+
+
+def decode_catalog_cursor(token: Optional[str], sort: str) -> Optional[List[Any]]:
+    """Токен страницы каталога для сортировки sort; битый или чужой токен даёт ValueError"""
+    after = decode_cursor(token, cursor_size(sort))
+    if after is None:
+        return None
+    if sort == RELEVANCE_SORT:
+        # По релевантности токен хранит смещение страницы
+        offset = after[0]
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise ValueError("Некорректный токен страницы")
+        return after
+    if not all(_valid_cursor_value(field, value) for (field, _), value in zip(CATALOG_SORTS[sort], after)):
+        raise ValueError("Некорректный токен страницы")
+    return after
+
+
+def resolve_sort(filters: ProductFilters, sort: Optional[str]) -> str:
+    """Без текстового поиска релевантность не определена — берём сортировку по умолчанию"""
+    has_text = bool(compile_product_filters(filters).texts)
+    if sort == RELEVANCE_SORT:
+        return RELEVANCE_SORT if has_text else DEFAULT_CATALOG_SORT
+    if sort in CATALOG_SORTS:
+        return sort
+    return RELEVANCE_SORT if has_text else DEFAULT_CATALOG_SORT
+
+
+def build_catalog_query(filters: ProductFilters, sort: str, after: Optional[List[Any]],
+                        page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """AQL одной страницы каталога: фильтры, условие продолжения, SORT и LIMIT page_size + 1"""
+    aql_query, filter_conditions, bind_vars = product_source(compile_product_filters(filters))
+
+    if sort == RELEVANCE_SORT:
+        offset = after[0] if after else 0
+        if filter_conditions:
+            aql_query += " FILTER " + " AND ".join(filter_conditions)
+        aql_query += " SORT BM25(p) DESC, p._key ASC LIMIT @page_offset, @page_limit RETURN p"
+        bind_vars.update(page_offset=max(0, int(offset)), page_limit=page_size + 1)
+        return aql_query, bind_vars
+
+    keys = CATALOG_SORTS[sort]
+    if after is not None:
+        condition, cursor_vars = keyset_filter("p", keys, after)
+        filter_conditions.append(condition)
+        bind_vars.update(cursor_vars)
+
+    if filter_conditions:
+        aql_query += " FILTER " + " AND ".join(filter_conditions)
+    aql_query += f" {sort_clause('p', keys)} LIMIT @page_limit RETURN p"
+    # Лишняя строка показывает, есть ли следующая страница
+    bind_vars["page_limit"] = page_size + 1
+    return aql_query, bind_vars
+
+
+def filter_signature(filters: ProductFilters) -> str:
+    """Ключ кэша: одинаковые после нормализации фильтры дают одну и ту же строку"""
+    compiled = compile_product_filters(filters)
+    return json.dumps({"where": compiled.bind_vars, "text": compiled.texts}, sort_keys=True, ensure_ascii=False)
+
+
+# Фасеты каталога: значения с количеством товаров и шаг гистограмм числовых полей
+FACET_VALUE_FIELDS = {"material": "material_lc", "color": "color_lc", "in_stock": "in_stock"}
+FACET_HISTOGRAM_STEPS = {"price": 5000, "width": 0.5, "height": 0.5}
+
+
+def build_facet_query(filters: ProductFilters) -> Tuple[str, Dict[str, Any]]:
+    """Фасеты одним запросом: на каждый фасет свой подзапрос COLLECT ... WITH COUNT
+    прямо по товарам под текущими фильтрами.
+
+    Подзапросы не собирают отфильтрованные товары в промежуточный массив: каждый
+    держит в памяти только группы своего фасета, а общее число — COLLECT WITH COUNT.
+    """
+    source, filter_conditions, bind_vars = product_source(compile_product_filters(filters))
+
+    def subquery(conditions: List[str], collect: str) -> str:
+        query = source
+        if conditions:
+            query += " FILTER " + " AND ".join(conditions)
+        return f"({query} {collect})"
+
+    facets = {name: f"p.{field}" for name, field in FACET_VALUE_FIELDS.items()}
+    for name, step in FACET_HISTOGRAM_STEPS.items():
+        facets[name] = f"FLOOR(p.{name} / @{name}_step)"
+        bind_vars[f"{name}_step"] = step
+
+    query = f"LET total = FIRST{subquery(filter_conditions, 'COLLECT WITH COUNT INTO n RETURN n')}"
+    for name, value in facets.items():
+        field = FACET_VALUE_FIELDS.get(name, name)
+        query += (f" LET {name} = "
+                  + subquery(filter_conditions + [f"p.{field} != null"],
+                             f"COLLECT value = {value} WITH COUNT INTO n RETURN {{value, n}}"))
+    query += " RETURN {total, " + ", ".join(facets) + "}"
+    return query, bind_vars
+
+
+def collect_facets(rows: List[dict]) -> Dict[str, Any]:
+    """Счётчики по значениям и гистограммы из результата build_facet_query"""
+    result = rows[0] if rows else {}
+    facets: Dict[str, Any] = {"total": result.get("total", 0)}
+    for name in FACET_VALUE_FIELDS:
+        groups = [group for group in result.get(name, []) if group["value"] != ""]
+        facets[name] = [{"value": group["value"], "count": group["n"]}
+                        for group in sorted(groups, key=lambda group: (-group["n"], str(group["value"])))]
+    for name, step in FACET_HISTOGRAM_STEPS.items():
+        groups = sorted(result.get(name, []), key=lambda group: group["value"])
+        facets[name] = [{"from": int(group["value"]) * step, "to": (int(group["value"]) + 1) * step,
+                         "count": group["n"]}
+                        for group in groups]
+    return facets
+
+
+def catalog_next_cursor(rows: List[dict], sort: str, after: Optional[List[Any]], page_size: int) -> Optional[str]:
+    if sort == RELEVANCE_SORT:
+        if len(rows) <= page_size:
+            return None
+        return encode_cursor([(after[0] if after else 0) + page_size])
+    return next_cursor(rows, CATALOG_SORTS[sort], page_size)
+
+
+def admin_search_query(search: str) -> Tuple[str, Dict[str, Any]]:
+    """Поиск товаров по названию для админки через products_search с ранжированием"""
+    term = search.strip().lower()
+    condition, bind_vars = search_condition("p", "name", term, "search")
+    aql = f"FOR p IN {PRODUCT_SEARCH_VIEW} SEARCH {condition}"
+    if len(term) >= NGRAM_SIZE:
+        aql += " FILTER CONTAINS(LOWER(p.name), @search)"
+    aql += " SORT BM25(p) DESC RETURN p"
+    return aql, bind_vars
@@ -6,89 +6,97 @@ from datetime import datetime
 from typing import Optional
 from arango.database import StandardDatabase
 from pathlib import Path
-import json
+import threading
+import time
 import traceback
 
+from .balancer import CoordinatorPool, BalancedHostResolver, BalancedHTTPClient
+from .analytics import rebuild_rollups
+from .migrations import migrate, schema_is_current
+from .loader import bulk_load, detect_format, iter_documents, open_text
+
 
 # Конфигурация подключения к ArangoDB
 ARANGO_HOST = os.getenv("ARANGO_HOST", "http://arangodb:8529")
+# Список координаторов через запятую; по умолчанию — единственный ARANGO_HOST
+ARANGO_HOSTS = [h.strip().rstrip("/") for h in os.getenv("ARANGO_HOSTS", ARANGO_HOST).split(",") if h.strip()]
 DB_NAME = os.getenv("ARANGO_DB", "windowshop")
 DB_USER = os.getenv("ARANGO_USER", "ARANGO_USER")
 DB_PASS = os.getenv("ARANGO_PASS", "ARANGO_PASS")
 
+# Настройки пула HTTP-соединений и балансировки
+ARANGO_BALANCE = os.getenv("ARANGO_BALANCE", "round_robin")  # round_robin | least_loaded
+ARANGO_POOL_SIZE = int(os.getenv("ARANGO_POOL_SIZE", "32"))
+ARANGO_MAX_CONNECTIONS_PER_HOST = int(os.getenv("ARANGO_MAX_CONNECTIONS_PER_HOST", "0"))  # 0 — без лимита
+ARANGO_POOL_TIMEOUT = float(os.getenv("ARANGO_POOL_TIMEOUT", "10"))
+ARANGO_KEEP_ALIVE = os.getenv("ARANGO_KEEP_ALIVE", "1") == "1"
+ARANGO_REQUEST_TIMEOUT = float(os.getenv("ARANGO_REQUEST_TIMEOUT", "60"))
+ARANGO_RETRIES = int(os.getenv("ARANGO_RETRIES", "3"))
+ARANGO_MAX_FAILURES = int(os.getenv("ARANGO_MAX_FAILURES", "3"))
+ARANGO_EJECT_SECONDS = float(os.getenv("ARANGO_EJECT_SECONDS", "30"))
+
 # Глобальная переменная для хранения подключения
 _db: Optional['StandardDatabase'] = None
+_db_lock = threading.Lock()
+
+coordinator_pool = CoordinatorPool(
+    ARANGO_HOSTS,
+    strategy=ARANGO_BALANCE,
+    max_per_host=ARANGO_MAX_CONNECTIONS_PER_HOST,
+    acquire_timeout=ARANGO_POOL_TIMEOUT,
+    max_failures=ARANGO_MAX_FAILURES,
+    eject_seconds=ARANGO_EJECT_SECONDS
+)
+
+def create_client() -> ArangoClient:
+    """Создаёт клиента с настроенным пулом соединений и балансировкой по координаторам"""
+    http_client = BalancedHTTPClient(
+        coordinator_pool,
+        keep_alive=ARANGO_KEEP_ALIVE,
+        request_timeout=ARANGO_REQUEST_TIMEOUT,
+        retry_attempts=ARANGO_RETRIES,
+        pool_connections=len(ARANGO_HOSTS),
+        pool_maxsize=ARANGO_POOL_SIZE
+    )
+    return ArangoClient(
+        hosts=ARANGO_HOSTS,
+        host_resolver=BalancedHostResolver(coordinator_pool, max_tries=len(ARANGO_HOSTS) + 1),
+        http_client=http_client
+    )
 
 def get_db():
     """Устанавливает соединение с ArangoDB и возвращает объект базы данных"""
     global _db
     if _db is None:
-        try:
-            client = ArangoClient(hosts=ARANGO_HOST)
-            sys_db = client.db('_system', username=DB_USER, password=DB_PASS)
-            
-            if not sys_db.has_database(DB_NAME):
-                sys_db.create_database(DB_NAME)
-                print(f"Создана база данных: {DB_NAME}")
-            
-            _db = client.db(DB_NAME, username=DB_USER, password=DB_PASS)
-        except Exception as e:
-            print(f"Ошибка подключения к ArangoDB: {e}")
-            raise
+        # Первое обращение может прийти одновременно из нескольких потоков пула —
+        # клиент и база создаются один раз
+        with _db_lock:
+            if _db is None:
+                try:
+                    client = create_client()
+                    sys_db = client.db('_system', username=DB_USER, password=DB_PASS)
+
+                    if not sys_db.has_database(DB_NAME):
+                        sys_db.create_database(DB_NAME)
+                        print(f"Создана база данных: {DB_NAME}")
+
+                    _db = client.db(DB_NAME, username=DB_USER, password=DB_PASS)
+                except Exception as e:
+                    print(f"Ошибка подключения к ArangoDB: {e}")
+                    raise
     return _db
 
 def init_db():
-    """Инициализирует базу данных: создает коллекции, индексы и тестовые данные"""
+    """Приводит схему базы данных к актуальной версии (см. app/migrations.py)"""
     try:
         db = get_db()
-        
-        # Создаем основные коллекции
-        collections = [
-            "users",       # Пользователи системы
-            "products",    # Оконные конструкции
-            "orders",      # Заказы клиентов
-            "measurements", # Замеры
-            "photos"        # Фотографии товаров
-        ]
-        
-        # Создаем edge-коллекции для связей
-        edge_collections = [
-            ("created_order", "users", "orders"),      # Пользователь создал заказ
-            ("contain_product", "orders", "products"), # Заказ содержит товары
-            ("product_photos", "products", "photos"),  # Товар имеет фотографии
-            ("assigned_measurement", "users", "measurements") # Замерщик назначен на замер
-        ]
-        
-        # Создаем обычные коллекции
-        for col_name in collections:
-            if not db.has_collection(col_name):
-                db.create_collection(col_name)
-                print(f"Создана коллекция: {col_name}")
-        
-        # Создаем edge-коллекции и связи
-        for edge_name, from_col, to_col in edge_collections:
-            if not db.has_collection(edge_name):
-                db.create_collection(edge_name, edge=True)
-                print(f"Создана edge-коллекция: {edge_name} ({from_col} -> {to_col})")
-        
-        # Создаем индексы для ускорения поиска
-        if db.has_collection("users"):
-            users = db.collection("users")
-            users.add_persistent_index(["phone_number"], unique=True)
-            users.add_persistent_index(["role"])
-            users.add_persistent_index(["last_name", "first_name"])
-        
-        if db.has_collection("products"):
-            products = db.collection("products")
-            products.add_persistent_index(["name"])
-            products.add_persistent_index(["material"])
-            products.add_persistent_index(["price"])
-            products.add_fulltext_index(["description"])
-        
-        # Инициализация тестовых данных
-        #init_test_data(db)
-
-        
+        applied = migrate(db)
+        if applied:
+            print(f"Применены миграции схемы: {applied}")
+        if not schema_is_current(db):
+            # migrate пропускает шаги, пока их выполняет другой процесс; данные грузим
+            # только в готовую схему, а start_database повторит попытку позже
+            raise RuntimeError("Схему базы ещё обновляет другой процесс")
         return db
     except Exception as e:
         print(f"Ошибка инициализации БД: {e}")
@@ -217,61 +225,70 @@ def init_test_data(db):
         })
         
         print("Добавлены тестовые заказы и связи")
-def is_collection_empty(name):
-    try:
-        count = db.collection(name).count()
-        print(f"[INFO] Коллекция '{name}' содержит {count} элементов")
-        return count == 0
-    except Exception as e:
-        print(f"[ERROR] Ошибка при проверке коллекции '{name}': {e}")
-        traceback.print_exc()
-        return False
-
-
-def load_initial_data():
-    print(f" Проверка наличия файла")
-
-    data_path = Path(__file__).parent / "data" / "initial_data.json"
+# Файл начальных данных и размер пачки для import_bulk
+SEED_DATA_PATH = Path(os.getenv("SEED_DATA_PATH", Path(__file__).parent / "data" / "initial_data.json"))
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "1000"))
 
+def load_initial_data(data_path: Path = SEED_DATA_PATH, batch_size: int = SEED_BATCH_SIZE):
+    """Потоково загружает начальные данные в пустые коллекции (см. app/loader.py)"""
     print(f" Проверка наличия файла начальных данных по пути: {data_path}")
     if not data_path.exists():
         print(f"[ERROR] Файл с начальными данными не найден: {data_path}")
-        return
+        return None
 
     try:
-        with open(data_path, "r", encoding="utf-8") as f:
-            f.seek(0)
-            data = json.load(f)
+        with open(data_path, "rb") as raw:
+            fp = open_text(raw, data_path.name)
+            report = bulk_load(
+                get_db(),
+                iter_documents(fp, detect_format(data_path.name)),
+                batch_size=batch_size,
+                only_empty=True
+            )
     except Exception as e:
-        print(f"[ERROR] Не удалось загрузить или распарсить JSON-файл: {e}")
+        print(f"[ERROR] Не удалось загрузить начальные данные: {e}")
         traceback.print_exc()
-        return
+        return None
 
-    collections = ["products", "orders", "users", "measurements"]
+    print(f"[INFO] Начальные данные: загружено {report.created}, ошибок {report.errors}, "
+          f"пропущены непустые коллекции {report.skipped_collections}, {report.rows_per_sec} док/с")
+    for message in report.error_samples:
+        print(f"[ERROR] {message}")
+    if "orders" in report.per_collection:
+        rollups = rebuild_rollups(get_db())
+        print(f"[INFO] Агрегаты продаж пересчитаны за {rollups['elapsed_ms']} мс")
+    return report
 
-    for col in collections:
-        if is_collection_empty(col):
-            print(f"[INFO] Коллекция '{col}' пустая — загружаем данные...")
-            for item in data.get(col, []):
-                item.pop("_id", None)
-                item.pop("_rev", None)
-                try:
-                    db.collection(col).insert(item)
-                    print(f"[SUCCESS] Документ вставлен в '{col}': {item.get('_key', '<без ключа>')}")
-                except Exception as e:
-                    print(f"[ERROR] Ошибка вставки в коллекцию '{col}': {e}")
-                    print(f"[DATA] Проблемный документ: {item}")
-                    traceback.print_exc()
-        else:
-            print(f"[INFO] Коллекция '{col}' уже содержит данные — пропускаем загрузку")
 
+# Пропуск работы со схемой (коллекции, индексы, начальные данные) — для воркеров,
+# когда схему уже подготовил отдельный процесс
+SKIP_SCHEMA_INIT = os.getenv("SKIP_SCHEMA_INIT", "0") == "1"
+
+# Результат последней попытки запуска, отдаётся в /api/health
+startup_state = {
+    "ready": False,
+    "schema_initialized": False,
+    "elapsed_ms": None,
+    "error": None
+}
 
+def is_connected() -> bool:
+    return _db is not None
+
+def startup(run_schema: bool = not SKIP_SCHEMA_INIT):
+    """Подключается к БД и при необходимости готовит схему; вызывается из lifespan приложения"""
+    started = time.perf_counter()
+    try:
+        get_db()
+        if run_schema:
+            init_db()
+            load_initial_data()
+    except Exception as e:
+        startup_state.update(ready=False, error=str(e))
+        raise
+    finally:
+        startup_state["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
-# Инициализация базы данных при импорте модуля
-try:
-    db = init_db()
-    load_initial_data()
-    print("База данных успешно инициализирована")
-except Exception as e:
-    print(f"Ошибка инициализации БД: {e}")
-    db = None
\ No newline at end of file
+    startup_state.update(ready=True, schema_initialized=run_schema, error=None)
+    print(f"[INFO] БД готова за {startup_state['elapsed_ms']} мс, "
+          f"схема {'инициализирована' if run_schema else 'пропущена'}")
\ No newline at end of file
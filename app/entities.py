@@ -0,0 +1,30 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Коллекции, доступные в универсальном редакторе сущностей (/entities/)
+ENTITY_TYPES = ["users", "products", "orders", "measurements", "photos"]
+
+# Поля, которые показывает список entities/list.html; полный документ
+# загружается только на странице редактирования
+ENTITY_LIST_FIELDS: Dict[str, List[str]] = {
+    "users": ["username", "first_name", "last_name", "role", "phone_number"],
+    "products": ["name", "material", "color", "width", "height", "price", "in_stock"],
+    "orders": ["customer_name", "product_name", "quantity", "total_price", "status", "created_at"],
+    "measurements": ["product_id", "user_id", "width", "height", "depth", "created_at"],
+    "photos": ["product_id", "url", "created_at"],
+}
+
+ENTITY_PAGE_SIZE = 50
+ENTITY_MAX_PAGE_SIZE = 500
+
+
+def build_entity_page_query(entity_type: str, after: Optional[str], page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """Страница коллекции в порядке первичного индекса: _key > @after, только поля списка"""
+    bind_vars: Dict[str, Any] = {"@col": entity_type, "page_limit": page_size + 1}
+    query = "FOR d IN @@col"
+    if after is not None:
+        query += " FILTER d._key > @after"
+        bind_vars["after"] = after
+    fields = ", ".join(f"{field}: d.{field}" for field in ENTITY_LIST_FIELDS[entity_type])
+    query += f" SORT d._key LIMIT @page_limit RETURN {{_key: d._key, {fields}}}"
+    return query, bind_vars
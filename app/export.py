@@ -0,0 +1,62 @@
+import json
+import zlib
+from typing import AsyncIterator, List
+
+from .repository import AsyncDatabase
+
+
+# Коллекции, доступные для выгрузки через /admin/export
+EXPORT_COLLECTIONS = ["products", "orders", "users", "measurements"]
+EXPORT_FORMATS = ("json", "ndjson")
+
+# Выходной буфер: сколько байт копим перед отправкой очередного куска клиенту
+FLUSH_BYTES = 64 * 1024
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+async def export_chunks(repo: AsyncDatabase, collections: List[str], fmt: str,
+                        batch_size: int) -> AsyncIterator[bytes]:
+    """Выгружает коллекции по мере чтения из курсоров.
+
+    json   — {"products": [...], "orders": [...]}, совместимо с /admin/import;
+    ndjson — по строке {"collection": ..., "document": ...} на документ.
+    """
+    parts: List[str] = []
+    size = 0
+
+    if fmt == "json":
+        parts.append("{")
+    for index, collection in enumerate(collections):
+        if fmt == "json":
+            parts.append(("," if index else "") + _dumps(collection) + ":[")
+        first = True
+        async for batch in repo.aql.stream("FOR d IN @@col RETURN d", {"@col": collection}, batch_size=batch_size):
+            for document in batch:
+                if fmt == "json":
+                    piece = ("" if first else ",") + _dumps(document)
+                else:
+                    piece = _dumps({"collection": collection, "document": document}) + "\n"
+                first = False
+                parts.append(piece)
+                size += len(piece)
+            if size >= FLUSH_BYTES:
+                yield "".join(parts).encode("utf-8")
+                parts, size = [], 0
+        if fmt == "json":
+            parts.append("]")
+    if fmt == "json":
+        parts.append("}")
+    yield "".join(parts).encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Сжимает поток в формат gzip на лету"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import UploadFile
+
+from .db import get_db
+from .loader import LoadReport, bulk_load, detect_format, iter_documents, open_text
+
+
+# Фоновый импорт: каталог для временных файлов, размер пачки и число параллельных импортов
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR") or tempfile.gettempdir()
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+# Сколько последних заданий хранить для страницы статуса
+IMPORT_JOBS_KEEP = 50
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+IMPORT_COLLECTIONS = ["products", "orders", "users", "measurements"]
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+_jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+
+
+class ImportJob:
+    """Состояние фонового импорта, отдаётся эндпоинтом статуса"""
+
+    def __init__(self, filename: str, on_duplicate: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.on_duplicate = on_duplicate
+        self.status = "queued"  # queued | running | done | failed
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.report = LoadReport()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "on_duplicate": self.on_duplicate,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            **self.report.as_dict()
+        }
+
+
+async def spool_upload(upload: UploadFile) -> str:
+    """Сохраняет загруженный файл на диск по частям и возвращает путь к нему"""
+    suffix = os.path.basename(upload.filename or "")
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=f"-{suffix}", dir=IMPORT_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+    return path
+
+
+def _finish(job: ImportJob, on_finished: Optional[Callable[[ImportJob], None]]):
+    """Обработка после загрузки (кэши, агрегаты); её ошибка — ошибка задания"""
+    if not on_finished:
+        return
+    try:
+        on_finished(job)
+    except Exception as e:
+        print(f"Ошибка завершения импорта {job.id}: {e}")
+        job.status = "failed"
+        job.error = job.error or f"Данные загружены, но обработка после импорта не выполнена: {e}"
+
+
+def _run(job: ImportJob, path: str, on_finished: Optional[Callable[[ImportJob], None]]):
+    job.status = "running"
+    job.report.started_at = time.time()
+    try:
+        with open(path, "rb") as raw:
+            fp = open_text(raw, job.filename)
+            bulk_load(
+                get_db(),
+                iter_documents(fp, detect_format(job.filename)),
+                batch_size=IMPORT_BATCH_SIZE,
+                on_duplicate=job.on_duplicate,
+                collections=IMPORT_COLLECTIONS,
+                report=job.report
+            )
+    except Exception as e:
+        print(f"Ошибка импорта данных: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        os.remove(path)
+    # done ставится только после обработки: пока пересчитываются агрегаты, задание — running
+    _finish(job, on_finished)
+    if job.status == "running":
+        job.status = "done"
+
+
+def start_import(path: str, filename: str, on_duplicate: str,
+                 on_finished: Optional[Callable[[ImportJob], None]] = None) -> ImportJob:
+    job = ImportJob(filename, on_duplicate)
+    _jobs[job.id] = job
+    while len(_jobs) > IMPORT_JOBS_KEEP:
+        _jobs.popitem(last=False)
+    _executor.submit(_run, job, path, on_finished)
+    return job
+
+
+def get_job(job_id: str) -> Optional[ImportJob]:
+    return _jobs.get(job_id)
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
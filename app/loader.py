@@ -0,0 +1,312 @@
+"""Потоковая загрузка документов в ArangoDB пачками через import_bulk.
+
+Поддерживаются два формата:
+  * JSON вида {"products": [...], "orders": [...], ...} — как app/data/initial_data.json
+    и файл выгрузки /admin/export;
+  * NDJSON — по одной строке {"collection": "products", "document": {...}} на документ.
+Файлы с расширением .gz распаковываются на лету.
+
+Пример загрузки сида в стенд:
+    python -m app.loader seed.ndjson.gz --batch-size 5000 --on-duplicate replace
+"""
+import argparse
+import gzip
+import io
+import json
+import time
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from arango.database import StandardDatabase
+
+from .catalog import normalize_product
+from .migrations import DOCUMENT_COLLECTIONS, EDGE_COLLECTIONS
+
+
+# Коллекции, в которые разрешено загружать данные: сначала вершины, затем рёбра
+LOADABLE_COLLECTIONS = DOCUMENT_COLLECTIONS + [name for name, _, _ in EDGE_COLLECTIONS]
+
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+# Сколько сообщений об ошибках хранить в отчёте (счётчик ошибок при этом полный)
+MAX_ERROR_SAMPLES = 50
+
+ON_DUPLICATE_POLICIES = ("error", "update", "replace", "ignore")
+
+Document = Tuple[str, dict]
+
+
+class StreamingJSONReader:
+    """Инкрементальный разбор JSON-объекта вида {"коллекция": [документы]}"""
+
+    def __init__(self, fp: IO[str], chunk_size: int = READ_CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._fp.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Отбрасываем уже разобранную часть, чтобы буфер не рос вместе с файлом
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Ожидался символ {char!r}, получен {found or 'конец файла'!r}")
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            if end == len(self._buf) and self._fill():
+                # Значение упёрлось в конец буфера (например, число) — дочитываем и разбираем заново
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self) -> Iterator[Document]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            collection = self._value()
+            self._expect(":")
+            if self._peek() == "[":
+                self._pos += 1
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield collection, self._value()
+                        if self._peek() == ",":
+                            self._pos += 1
+                            continue
+                        self._expect("]")
+                        break
+            else:
+                # Не массив документов — значение пропускаем
+                self._value()
+
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
+
+
+def iter_ndjson(fp: IO[str]) -> Iterator[Document]:
+    for line_no, line in enumerate(fp, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if "collection" not in record or "document" not in record:
+            raise ValueError(f"Строка {line_no}: ожидаются поля collection и document")
+        yield record["collection"], record["document"]
+
+
+def detect_format(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "ndjson" if name.endswith((".ndjson", ".jsonl")) else "json"
+
+
+def open_text(fp: IO[bytes], filename: str) -> IO[str]:
+    """Оборачивает бинарный поток в текстовый, распаковывая gzip по расширению"""
+    if filename.lower().endswith(".gz"):
+        fp = gzip.GzipFile(fileobj=fp, mode="rb")
+    return io.TextIOWrapper(fp, encoding="utf-8")
+
+
+def iter_documents(fp: IO[str], fmt: str) -> Iterable[Document]:
+    return iter_ndjson(fp) if fmt == "ndjson" else StreamingJSONReader(fp)
+
+
+class LoadReport:
+    """Итоги загрузки: счётчики по коллекциям и образцы ошибок"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.ignored = 0
+        self.errors = 0
+        self.per_collection: Dict[str, Dict[str, int]] = {}
+        self.skipped_collections: List[str] = []
+        self.error_samples: List[str] = []
+
+    def add_error(self, message: str):
+        self.errors += 1
+        if len(self.error_samples) < MAX_ERROR_SAMPLES:
+            self.error_samples.append(message)
+
+    def add_result(self, collection: str, result: dict):
+        counters = self.per_collection.setdefault(collection, {"created": 0, "updated": 0, "ignored": 0, "errors": 0})
+        for field in ("created", "updated", "ignored", "errors"):
+            counters[field] += result.get(field, 0)
+        self.created += result.get("created", 0)
+        self.updated += result.get("updated", 0)
+        self.ignored += result.get("ignored", 0)
+        details = result.get("details") or []
+        for message in details:
+            self.add_error(f"{collection}: {message}")
+        # Если сервер не вернул подробности, досчитываем ошибки по счётчику
+        self.errors += max(0, result.get("errors", 0) - len(details))
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def rows_per_sec(self) -> float:
+        return round(self.read / self.elapsed, 1) if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "created": self.created,
+            "updated": self.updated,
+            "ignored": self.ignored,
+            "errors": self.errors,
+            "rows_per_sec": self.rows_per_sec,
+            "elapsed_sec": round(self.elapsed, 2),
+            "per_collection": self.per_collection,
+            "skipped_collections": self.skipped_collections,
+            "error_samples": self.error_samples,
+        }
+
+
+def bulk_load(
+    db: StandardDatabase,
+    documents: Iterable[Document],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_duplicate: str = "error",
+    only_empty: bool = False,
+    collections: Optional[List[str]] = None,
+    report: Optional[LoadReport] = None,
+    progress: Optional[Callable[[LoadReport], None]] = None,
+    transform: Optional[Callable[[str, dict], dict]] = None,
+) -> LoadReport:
+    """Загружает поток (коллекция, документ) пачками import_bulk.
+
+    only_empty — загружать только в пустые коллекции (режим начального заполнения);
+    collections — разрешённые коллекции, по умолчанию LOADABLE_COLLECTIONS;
+    transform — дополнительная обработка документа перед вставкой.
+    """
+    if on_duplicate not in ON_DUPLICATE_POLICIES:
+        raise ValueError(f"Неизвестная политика on_duplicate: {on_duplicate}")
+
+    allowed = set(collections or LOADABLE_COLLECTIONS)
+    report = report or LoadReport()
+    batches: Dict[str, List[dict]] = {}
+    accepted: Dict[str, bool] = {}
+
+    def flush(collection: str):
+        batch = batches.pop(collection, None)
+        if not batch:
+            return
+        try:
+            result = db.collection(collection).import_bulk(
+                batch, halt_on_error=False, details=True, on_duplicate=on_duplicate
+            )
+            report.add_result(collection, result)
+        except Exception as e:
+            # Пачка целиком не принята (например, сбой соединения) — учитываем все документы
+            report.add_error(f"{collection}: пачка из {len(batch)} документов не загружена: {e}")
+            report.errors += len(batch) - 1
+        if progress:
+            progress(report)
+
+    try:
+        for collection, document in documents:
+            report.read += 1
+            if collection not in accepted:
+                if collection not in allowed:
+                    accepted[collection] = False
+                    report.add_error(f"{collection}: коллекция не поддерживается для загрузки")
+                elif only_empty and db.collection(collection).count() > 0:
+                    accepted[collection] = False
+                    report.skipped_collections.append(collection)
+                else:
+                    accepted[collection] = True
+            if not accepted[collection]:
+                continue
+            if not isinstance(document, dict):
+                report.add_error(f"{collection}: запись {report.read} — не JSON-объект ({type(document).__name__})")
+                continue
+
+            document.pop("_id", None)
+            document.pop("_rev", None)
+            if collection == "products":
+                # Поля material_lc / color_lc нужны индексам фильтров каталога
+                normalize_product(document)
+            if transform:
+                document = transform(collection, document)
+
+            batch = batches.setdefault(collection, [])
+            batch.append(document)
+            if len(batch) >= batch_size:
+                flush(collection)
+
+        for collection in list(batches):
+            flush(collection)
+    finally:
+        report.finished_at = time.time()
+    return report
+
+
+def main():
+    from .db import get_db
+
+    parser = argparse.ArgumentParser(description="Потоковая загрузка данных в ArangoDB")
+    parser.add_argument("path", help="JSON/NDJSON файл, допускается .gz")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--on-duplicate", choices=ON_DUPLICATE_POLICIES, default="error")
+    parser.add_argument("--only-empty", action="store_true", help="загружать только в пустые коллекции")
+    args = parser.parse_args()
+
+    def print_progress(report: LoadReport):
+        print(f"[INFO] прочитано {report.read}, {report.rows_per_sec} док/с, ошибок {report.errors}")
+
+    with open(args.path, "rb") as raw:
+        fp = open_text(raw, args.path)
+        report = bulk_load(
+            get_db(),
+            iter_documents(fp, detect_format(args.path)),
+            batch_size=args.batch_size,
+            on_duplicate=args.on_duplicate,
+            only_empty=args.only_empty,
+            progress=print_progress,
+        )
+    print(json.dumps(report.as_dict(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,27 +4,94 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 import jwt
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from arango.database import StandardDatabase
-from arango.exceptions import ArangoError
-from .db import db
+from arango.exceptions import ArangoError, DocumentUpdateError
+from .db import coordinator_pool, is_connected, startup, startup_state
+from .repository import repo, run_sync, shutdown_executor
+from .stats import StatsCache
+from .metrics import begin_request, end_request, metrics
+from .slowlog import slow_queries
+from .cache import TTLCache, json_size
+from .auth import password_verifier, LoginPoolSaturated
+from .export import EXPORT_COLLECTIONS, EXPORT_FORMATS, export_chunks, gzip_chunks
+from .jobs import ImportJob, get_job, spool_upload, start_import
+from .jobs import shutdown_executor as shutdown_import_executor
+from .loader import ON_DUPLICATE_POLICIES
+from .catalog import (ProductFilters, CATALOG_SORT_LABELS, admin_search_query, build_catalog_query,
+                      build_facet_query, catalog_next_cursor, collect_facets, decode_catalog_cursor,
+                      filter_signature, normalize_product, resolve_sort)
+from .pagination import clamp_page_size, decode_cursor, next_cursor
+from .orders import (ADMIN_ORDER_SORTS, ADMIN_ORDER_SORT_LABELS, DEFAULT_ADMIN_ORDER_SORT, MY_ORDERS_SORT,
+                     ORDER_STATUS_LABELS, OrderFilters, build_admin_orders_query, build_my_orders_query,
+                     create_order_query)
+from .analytics import (DAILY_REPORT_AQL, MATERIAL_REPORT_AQL, MONTHLY_REPORT_AQL, TOP_PRODUCTS_AQL,
+                        rebuild_rollups, update_order)
+from .entities import ENTITY_MAX_PAGE_SIZE, ENTITY_PAGE_SIZE, ENTITY_TYPES, build_entity_page_query
+from .users import ADMIN_USERS_SORT, USER_ROLES, build_admin_users_query
 from fastapi import Request, Response
 from fastapi.responses import RedirectResponse
 from fastapi.responses import JSONResponse
 from fastapi import File, UploadFile
 import json
-from io import BytesIO
 from fastapi.responses import StreamingResponse
 from pathlib import Path
 import traceback
+import asyncio
+from contextlib import asynccontextmanager
+import time
 
 
+# Пауза между повторными попытками подключения к БД, если при запуске она недоступна
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
 
-app = FastAPI(title="WindowShop", description="Система заказов оконных конструкций")
+async def start_database():
+    """Готовит БД, повторяя попытки в фоне, пока она недоступна"""
+    while True:
+        try:
+            await run_sync(startup)
+            return
+        except Exception as e:
+            print(f"Ошибка инициализации БД: {e}; повтор через {STARTUP_RETRY_SECONDS} с")
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+# Сводка для админ-панели и /api/health, обновляется фоновой задачей
+stats_cache = StatsCache(repo)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # БД готовится в фоне, запуск воркера её не ждёт; готовность видна в /api/health
+    startup_task = asyncio.create_task(start_database())
+    stats_task = asyncio.create_task(stats_cache.run())
+    yield
+    stats_task.cancel()
+    startup_task.cancel()
+    password_verifier.shutdown()
+    shutdown_import_executor()
+    shutdown_executor()
+
+
+app = FastAPI(title="WindowShop", description="Система заказов оконных конструкций", lifespan=lifespan)
 templates = Jinja2Templates(directory="app/templates")
+
+
+@app.middleware("http")
+async def collect_metrics(request: Request, call_next):
+    """Задержка, код ответа и обращения к БД по маршрутам — для /metrics"""
+    stats, token, started = begin_request()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Шаблон пути маршрута, а не сам путь — чтобы число рядов метрик не росло с данными
+        route = request.scope.get("route")
+        end_request(request.method, getattr(route, "path", "unmatched"), status_code, stats, token, started)
+
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 def format_datetime(value, format="%d.%m.%Y %H:%M:%S"):
@@ -42,9 +109,52 @@ SECRET_KEY = os.getenv("SECRET_KEY", "secret-key-123")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кэш профилей пользователей (username -> User), чтобы не ходить в БД на каждый запрос
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Кэш фасетов каталога по сигнатуре фильтров: счётчики допускают небольшое отставание
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", "256"))
+FACET_CACHE_TTL = float(os.getenv("FACET_CACHE_TTL", "60"))
+facet_cache = TTLCache(maxsize=FACET_CACHE_SIZE, ttl=FACET_CACHE_TTL)
+
+# Кэш страниц каталога: ключ — AQL по нормализованным фильтрам и его bind vars
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL, max_bytes=CATALOG_CACHE_MAX_BYTES)
+
+# Размер страницы каталога по умолчанию и верхняя граница
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24"))
+CATALOG_MAX_PAGE_SIZE = int(os.getenv("CATALOG_MAX_PAGE_SIZE", "100"))
+# Размер страницы списков заказов (/my-orders, /admin/orders)
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", "20"))
+ORDERS_MAX_PAGE_SIZE = int(os.getenv("ORDERS_MAX_PAGE_SIZE", "100"))
+# Размер страницы списка пользователей в админке
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "50"))
+USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "200"))
+
+# Режим аутентификации: "stateless" — профиль и эпоха токена лежат в самом JWT,
+# "lookup" — профиль при каждом запросе берётся из коллекции users (через user_cache)
+AUTH_MODE = os.getenv("AUTH_MODE", "stateless")
+
+# Кэш эпох токенов (users._key -> token_epoch). TTL ограничивает время, за которое
+# повышение эпохи в другом процессе доходит до этого воркера: смена роли или отзыв
+# токена в другом воркере действуют здесь с опозданием до TOKEN_EPOCH_CACHE_TTL секунд
+TOKEN_EPOCH_CACHE_TTL = float(os.getenv("TOKEN_EPOCH_CACHE_TTL", "5"))
+token_epochs = TTLCache(maxsize=USER_CACHE_SIZE, ttl=TOKEN_EPOCH_CACHE_TTL)
+# Для токенов с этими ролями эпоха сверяется с БД на каждом запросе, без кэша, —
+# понижение или отзыв прав администратора действует сразу во всех воркерах
+TOKEN_EPOCH_UNCACHED_ROLES = {"admin", "superadmin"}
+
 class TokenData(BaseModel):
     username: str
     role: str
+    user_id: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    epoch: int = 0
     exp: Optional[datetime] = None
 
 class User(BaseModel):
@@ -54,19 +164,6 @@ class User(BaseModel):
     last_name: Optional[str] = None
     id: Optional[str] = None
 
-class ProductFilters(BaseModel):
-    name: Optional[str] = None
-    material: Optional[str] = None
-    color: Optional[str] = None
-    min_price: Optional[float] = None
-    max_price: Optional[float] = None
-    min_width: Optional[float] = None
-    max_width: Optional[float] = None
-    min_height: Optional[float] = None
-    max_height: Optional[float] = None
-    in_stock: Optional[bool] = None
-    description : Optional[str] = None
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -76,6 +173,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def token_claims(user_data: dict) -> dict:
+    """Формирует содержимое JWT: в режиме stateless туда же кладётся профиль и эпоха"""
+    claims = {"sub": user_data["username"], "role": user_data["role"]}
+    if AUTH_MODE == "stateless":
+        claims.update({
+            "uid": user_data["_key"],
+            "first_name": user_data.get("first_name"),
+            "last_name": user_data.get("last_name"),
+            "epoch": user_data.get("token_epoch", 0)
+        })
+    return claims
+
+async def current_token_epoch(user_key: str, cached: bool = True) -> Optional[int]:
+    """Текущая эпоха токенов пользователя; None, если пользователь удалён.
+
+    cached=False — читать эпоху из БД, не доверяя кэшу этого воркера.
+    """
+    epoch = token_epochs.get(user_key) if cached else None
+    if epoch is None:
+        rows = await repo.aql.execute(
+            "LET u = DOCUMENT('users', @key) RETURN u ? (u.token_epoch || 0) : null",
+            bind_vars={"key": user_key}
+        )
+        epoch = rows[0] if rows else None
+        if epoch is not None:
+            token_epochs.set(user_key, epoch)
+    return epoch
+
+async def bump_token_epoch(user_key: str):
+    """Увеличивает эпоху токенов: все ранее выданные токены пользователя перестают действовать"""
+    rows = await repo.aql.execute(
+        """
+        FOR u IN users
+            FILTER u._key == @key
+            UPDATE u WITH {token_epoch: (u.token_epoch || 0) + 1} IN users
+            RETURN NEW.token_epoch
+        """,
+        bind_vars={"key": user_key}
+    )
+    epoch = rows[0] if rows else None
+    if epoch is not None:
+        token_epochs.set(user_key, epoch)
+    invalidate_user_cache(user_key)
+
 async def get_current_user(request: Request) -> Optional[User]:
     token = request.cookies.get("access_token")
     if not token:
@@ -88,19 +229,58 @@ async def get_current_user(request: Request) -> Optional[User]:
         role: str = payload.get("role")
         if username is None:
             return None
-        
-        user_data = db.collection("users").find({"username": username}).next()
-        return User(
+
+        claims = TokenData(
+            username=username,
+            role=role,
+            user_id=payload.get("uid"),
+            first_name=payload.get("first_name"),
+            last_name=payload.get("last_name"),
+            epoch=payload.get("epoch", 0)
+        )
+        if AUTH_MODE == "stateless" and claims.user_id:
+            # Профиль берём из токена, в БД (через кэш) сверяем только эпоху
+            use_cache = claims.role not in TOKEN_EPOCH_UNCACHED_ROLES
+            if await current_token_epoch(claims.user_id, cached=use_cache) != claims.epoch:
+                return None
+            return User(
+                username=claims.username,
+                role=claims.role,
+                first_name=claims.first_name,
+                last_name=claims.last_name,
+                id=claims.user_id
+            )
+
+        cached = user_cache.get(username)
+        if cached is not None and cached.role == role:
+            return cached
+
+        user_data = await repo.collection("users").find_one({"username": username})
+        if user_data is None:
+            return None
+        user = User(
             username=username,
             role=role,
             first_name=user_data.get("first_name"),
             last_name=user_data.get("last_name"),
             id=user_data.get("_key")
         )
+        user_cache.set(username, user)
+        return user
     except Exception as e:
         print(f"Ошибка декодирования токена: {e}")
         return None
 
+def invalidate_catalog_caches():
+    """Сбрасывает закэшированные выборки каталога после записи в products"""
+    facet_cache.clear()
+    catalog_cache.clear()
+
+
+def invalidate_user_cache(user_key: str):
+    """Сбрасывает закэшированный профиль пользователя после изменения документа в users"""
+    user_cache.pop_where(lambda username, cached: cached.id == user_key or username == user_key)
+
 def verify_role(user: User, allowed_roles: List[str]):
     if not user or user.role not in allowed_roles:
         raise HTTPException(
@@ -108,50 +288,6 @@ def verify_role(user: User, allowed_roles: List[str]):
             detail="Недостаточно прав для выполнения этого действия"
         )
 
-def build_product_filters(filters: ProductFilters) -> dict:
-    query_filters = {}
-    
-    # Текстовые фильтры (точное совпадение)
-    if filters.name and filters.name.strip():
-        query_filters["name"] = {"$like": f"%{filters.name}%"}  # Регистронезависимый поиск
-    if filters.material and filters.material.strip():
-        query_filters["material"] = filters.material
-    if filters.color and filters.color.strip():
-        query_filters["color"] = filters.color
-    
-    # Числовые фильтры (используем правильные операторы для ArangoDB)
-    if filters.min_price is not None:
-        query_filters["price"] = {">=": float(filters.min_price)}
-    if filters.max_price is not None:
-        if "price" in query_filters:
-            query_filters["price"]["<="] = float(filters.max_price)
-        else:
-            query_filters["price"] = {"<=": float(filters.max_price)}
-    
-    # Фильтры по ширине
-    if filters.min_width is not None:
-        query_filters["width"] = {">=": float(filters.min_width)}
-    if filters.max_width is not None:
-        if "width" in query_filters:
-            query_filters["width"]["<="] = float(filters.max_width)
-        else:
-            query_filters["width"] = {"<=": float(filters.max_width)}
-    
-    # Фильтры по высоте
-    if filters.min_height is not None:
-        query_filters["height"] = {">=": float(filters.min_height)}
-    if filters.max_height is not None:
-        if "height" in query_filters:
-            query_filters["height"]["<="] = float(filters.max_height)
-        else:
-            query_filters["height"] = {"<=": float(filters.max_height)}
-    
-    # Фильтр по наличию
-    if filters.in_stock is not None:
-        query_filters["in_stock"] = bool(filters.in_stock)
-    
-    return query_filters
-
 @app.get("/")
 async def home(request: Request):
     user = await get_current_user(request)
@@ -174,8 +310,8 @@ async def login(
     password: str = Form(...)
 ):
     try:
-        user_data = db.collection("users").find({"username": username}).next()
-        if not user_data or not bcrypt.checkpw(password.encode(), user_data["password_hash"].encode()):
+        user_data = await repo.collection("users").find_one({"username": username})
+        if not user_data or not await password_verifier.verify(password, user_data["password_hash"]):
             return templates.TemplateResponse(
                 "login.html",
                 {
@@ -187,7 +323,7 @@ async def login(
             )
 
         access_token = create_access_token(
-            data={"sub": user_data["username"], "role": user_data["role"]},
+            data=token_claims(user_data),
             expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         )
 
@@ -201,6 +337,17 @@ async def login(
             samesite="lax"
         )
         return response
+    except LoginPoolSaturated:
+        return templates.TemplateResponse(
+            "login.html",
+            {
+                "request": request,
+                "error": "Сервер перегружен, повторите попытку через несколько секунд",
+                "is_authenticated": False
+            },
+            status_code=503,
+            headers={"Retry-After": "2"}
+        )
     except Exception as e:
         print(f"Ошибка входа: {e}")
         return templates.TemplateResponse(
@@ -219,6 +366,74 @@ async def logout():
     response.delete_cookie("access_token")
     return response
 
+def parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        if value and value.strip():
+            return float(value.strip())
+        return None
+    except ValueError:
+        return None
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        if value and value.strip():
+            return date.fromisoformat(value.strip())
+        return None
+    except ValueError:
+        return None
+
+
+def parse_product_filters(name, description, material, color, min_price, max_price,
+                          min_width, max_width, min_height, max_height, in_stock) -> ProductFilters:
+    return ProductFilters(
+        name=name,
+        description=description,
+        material=material,
+        color=color,
+        min_price=parse_float(min_price),
+        max_price=parse_float(max_price),
+        min_width=parse_float(min_width),
+        max_width=parse_float(max_width),
+        min_height=parse_float(min_height),
+        max_height=parse_float(max_height),
+        in_stock=in_stock == 'on' if in_stock is not None else None
+    )
+
+
+async def get_catalog_facets(filters: ProductFilters) -> dict:
+    """Счётчики фасетов для текущих фильтров; кэшируются по сигнатуре фильтров"""
+    signature = filter_signature(filters)
+    facets = facet_cache.get(signature)
+    if facets is None:
+        generation = facet_cache.generation
+        started = time.perf_counter()
+        aql_query, bind_vars = build_facet_query(filters)
+        facets = collect_facets(await repo.aql.execute(aql_query, bind_vars=bind_vars))
+        facet_cache.set(signature, facets, cost=time.perf_counter() - started, generation=generation)
+    return facets
+
+
+async def cached_catalog_page(aql_query: str, bind_vars: dict, full_count: bool) -> Tuple[List[dict], Optional[int]]:
+    """Страница каталога и (по запросу) fullCount — из catalog_cache или из БД"""
+    key = json.dumps([aql_query, bind_vars, full_count], sort_keys=True, ensure_ascii=False)
+    cached = catalog_cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation = catalog_cache.generation
+    started = time.perf_counter()
+    if full_count:
+        rows, stats = await repo.aql.execute_with_stats(aql_query, bind_vars=bind_vars, full_count=True)
+        result = (rows, stats.get("fullCount"))
+    else:
+        result = (await repo.aql.execute(aql_query, bind_vars=bind_vars), None)
+    # Запись не сохранится, если за время запроса каталог успели изменить
+    catalog_cache.set(key, result, size=json_size(result[0]),
+                      cost=time.perf_counter() - started, generation=generation)
+    return result
+
+
 @app.get("/products", response_class=HTMLResponse)
 async def list_products(
         request: Request,
@@ -233,89 +448,51 @@ async def list_products(
         max_width: Optional[str] = Query(None),
         min_height: Optional[str] = Query(None),
         max_height: Optional[str] = Query(None),
-        in_stock: Optional[str] = Query(None)
+        in_stock: Optional[str] = Query(None),
+        sort: Optional[str] = Query(None),
+        after: Optional[str] = Query(None),
+        page_size: Optional[int] = Query(None),
+        with_total: bool = Query(False),
+        total: Optional[int] = Query(None)
 ):
-    try:
-        def parse_float(value: Optional[str]) -> Optional[float]:
-            try:
-                if value and value.strip():
-                    return float(value.strip())
-                return None
-            except ValueError:
-                return None
+    page_size = clamp_page_size(page_size, CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE)
 
+    try:
         # Преобразуем параметры запроса в фильтры
-        filters = ProductFilters(
-            name=name,
-            description=description,
-            material=material,
-            color=color,
-            min_price=parse_float(min_price),
-            max_price=parse_float(max_price),
-            min_width=parse_float(min_width),
-            max_width=parse_float(max_width),
-            min_height=parse_float(min_height),
-            max_height=parse_float(max_height),
-            in_stock=in_stock == 'on' if in_stock is not None else None
+        filters = parse_product_filters(
+            name, description, material, color, min_price, max_price,
+            min_width, max_width, min_height, max_height, in_stock
         )
 
-        # Формируем AQL запрос
-        aql_query = "FOR p IN products"
-        bind_vars = {}
-        filter_conditions = []
-
-        # Улучшенный поиск по подстроке для текстовых полей
-        if filters.name:
-            filter_conditions.append("LIKE(LOWER(p.name), CONCAT('%', LOWER(@name), '%'))")
-            bind_vars["name"] = filters.name.strip().lower()
-
-        if filters.material:
-            filter_conditions.append("LIKE(LOWER(p.material), CONCAT('%', LOWER(@material), '%'))")
-            bind_vars["material"] = filters.material.strip().lower()
-
-        if filters.color:
-            filter_conditions.append("LIKE(LOWER(p.color), CONCAT('%', LOWER(@color), '%'))")
-            bind_vars["color"] = filters.color.strip().lower()
-
-        if filters.min_price is not None:
-            filter_conditions.append("p.price >= @min_price")
-            bind_vars["min_price"] = float(filters.min_price)
-
-        if filters.max_price is not None:
-            filter_conditions.append("p.price <= @max_price")
-            bind_vars["max_price"] = float(filters.max_price)
-
-        if filters.min_width is not None:
-            filter_conditions.append("p.width >= @min_width")
-            bind_vars["min_width"] = float(filters.min_width)
-
-        if filters.max_width is not None:
-            filter_conditions.append("p.width <= @max_width")
-            bind_vars["max_width"] = float(filters.max_width)
-
-        if filters.min_height is not None:
-            filter_conditions.append("p.height >= @min_height")
-            bind_vars["min_height"] = float(filters.min_height)
-
-        if filters.max_height is not None:
-            filter_conditions.append("p.height <= @max_height")
-            bind_vars["max_height"] = float(filters.max_height)
-
-        if filters.description:
-            filter_conditions.append("LIKE(LOWER(p.description), CONCAT('%', LOWER(@description), '%'))")
-            bind_vars["description"] = filters.description.strip().lower()
-
-        if filters.in_stock is not None:
-            filter_conditions.append("p.in_stock == @in_stock")
-            bind_vars["in_stock"] = bool(filters.in_stock)
-
-        if filter_conditions:
-            aql_query += " FILTER " + " AND ".join(filter_conditions)
+        sort = resolve_sort(filters, sort)
+        try:
+            cursor_values = decode_catalog_cursor(after, sort)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный токен страницы")
 
-        aql_query += " RETURN p"
+        # Формируем AQL запрос одной страницы (keyset-пагинация по индексированному полю)
+        aql_query, bind_vars = build_catalog_query(filters, sort, cursor_values, page_size)
 
-        # Выполняем запрос
-        products = list(db.aql.execute(aql_query, bind_vars=bind_vars))
+        # Выполняем запрос; общее число найденных считаем через fullCount только на первой странице,
+        # дальше оно передаётся в ссылках пагинации
+        if with_total and cursor_values is None:
+            products, total = await cached_catalog_page(aql_query, bind_vars, full_count=True)
+        else:
+            products, _ = await cached_catalog_page(aql_query, bind_vars, full_count=False)
+            if not with_total:
+                total = None
+
+        facets = await get_catalog_facets(filters)
+
+        cursor_token = catalog_next_cursor(products, sort, cursor_values, page_size)
+        products = products[:page_size]
+        next_url = None
+        if cursor_token:
+            next_params = {"after": cursor_token}
+            if total is not None:
+                next_params["total"] = total
+            next_url = str(request.url.include_query_params(**next_params))
+        first_url = str(request.url.remove_query_params(["after", "total"])) if cursor_values is not None else None
 
         # Подготавливаем данные для шаблона
         template_data = {
@@ -323,6 +500,14 @@ async def list_products(
             "user": user,
             "products": products,
             "is_authenticated": user is not None,
+            "total": total,
+            "next_url": next_url,
+            "first_url": first_url,
+            "sort": sort,
+            "sort_labels": CATALOG_SORT_LABELS,
+            "page_size": page_size,
+            "with_total": with_total,
+            "facets": facets,
             "filters": {
                 "name": name or "",
                 "description": description or "",
@@ -340,6 +525,8 @@ async def list_products(
 
         return templates.TemplateResponse("products/list.html", template_data)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Ошибка при загрузке товаров: {e}")
         return templates.TemplateResponse(
@@ -349,6 +536,27 @@ async def list_products(
         )
 
 
+@app.get("/products/facets")
+async def product_facets(
+        name: Optional[str] = Query(None),
+        material: Optional[str] = Query(None),
+        color: Optional[str] = Query(None),
+        description: Optional[str] = Query(None),
+        min_price: Optional[str] = Query(None),
+        max_price: Optional[str] = Query(None),
+        min_width: Optional[str] = Query(None),
+        max_width: Optional[str] = Query(None),
+        min_height: Optional[str] = Query(None),
+        max_height: Optional[str] = Query(None),
+        in_stock: Optional[str] = Query(None)
+):
+    filters = parse_product_filters(
+        name, description, material, color, min_price, max_price,
+        min_width, max_width, min_height, max_height, in_stock
+    )
+    return await get_catalog_facets(filters)
+
+
 @app.get("/profile", response_class=HTMLResponse)
 async def profile(request: Request, user: User = Depends(get_current_user)):
     if not user:
@@ -376,18 +584,17 @@ async def admin_dashboard(request: Request, user: User = Depends(get_current_use
     verify_role(user, ["admin", "superadmin"])
     
     try:
-        stats = {
-            "products_count": db.collection("products").count(),
-            "orders_count": db.collection("orders").count(),
-            "users_count": db.collection("users").count()
-        }
+        stats = await stats_cache.get()
         return templates.TemplateResponse(
             "admin/dashboard.html",
             {
                 "request": request,
                 "user": user,
                 "is_authenticated": True,
-                "stats": stats
+                "stats": stats,
+                "status_labels": ORDER_STATUS_LABELS,
+                "slow_queries": slow_queries.top(),
+                "slow_query_ms": slow_queries.threshold_ms
             }
         )
     except Exception as e:
@@ -402,7 +609,7 @@ async def admin_dashboard(request: Request, user: User = Depends(get_current_use
 async def new_order_form(request: Request, user: User = Depends(get_current_user)):
     verify_role(user, ["customer"])
     try:
-        products = list(db.collection("products").find({"in_stock": True}))
+        products = await repo.collection("products").find({"in_stock": True})
         return templates.TemplateResponse(
             "orders/new.html",
             {
@@ -431,41 +638,24 @@ async def create_order(
 ):
     verify_role(user, ["customer"])
     try:
-        # Получаем информацию о продукте
-        product = db.collection("products").get(product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Товар не найден")
-
-        # Создаем заказ
+        now = datetime.utcnow().isoformat()
         order_data = {
             "customer_id": user.id,
             "customer_name": f"{user.first_name or ''} {user.last_name or ''}".strip(),
             "product_id": product_id,
-            "product_name": product["name"],
             "quantity": quantity,
             "address": address,
             "comments": comments,
             "status": "new",
-            "total_price": product["price"] * quantity,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "created_at": now,
+            "updated_at": now
         }
 
-        # Сохраняем заказ в БД
-        order = db.collection("orders").insert(order_data)
-
-        # Проверяем и создаем коллекцию user_orders, если она не существует
-        if not db.has_collection("user_orders"):
-            db.create_collection("user_orders", edge=True)
-            print("Создана edge-коллекция user_orders")
-
-        # Создаем связь между пользователем и заказом
-        db.collection("user_orders").insert({
-            "_from": f"users/{user.id}",
-            "_to": f"orders/{order['_key']}",
-            "type": "created",
-            "created_at": datetime.utcnow().isoformat()
-        })
+        # Цена и название товара, заказ, рёбра и агрегаты продаж — одним атомарным запросом
+        created = await repo.aql.execute(*create_order_query(order_data))
+        if not created:
+            raise HTTPException(status_code=404, detail="Товар не найден")
+        stats_cache.mark_dirty()
 
         return RedirectResponse(url="/my-orders", status_code=303)
 
@@ -485,33 +675,41 @@ async def create_order(
         )
 
 @app.get("/my-orders", response_class=HTMLResponse)
-async def my_orders(request: Request, user: User = Depends(get_current_user)):
+async def my_orders(
+        request: Request,
+        user: User = Depends(get_current_user),
+        order_status: Optional[str] = Query(None, alias="status"),
+        after: Optional[str] = Query(None),
+        page_size: Optional[int] = Query(None)
+):
     verify_role(user, ["customer"])
+    page_size = clamp_page_size(page_size, ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE)
+    if order_status not in ORDER_STATUS_LABELS:
+        order_status = None
     try:
-        # Получаем заказы пользователя через AQL запрос
-        query = """
-        FOR order IN orders
-        FILTER order.customer_id == @customer_id
-        SORT order.created_at DESC
-        RETURN {
-            id: order._key,
-            product_name: order.product_name,
-            quantity: order.quantity,
-            address: order.address,
-            status: order.status,
-            total_price: order.total_price,
-            created_at: order.created_at,
-            comments: order.comments
-        }
-        """
-        orders = list(db.aql.execute(query, bind_vars={"customer_id": user.id}))
-        
+        cursor_values = decode_cursor(after, len(MY_ORDERS_SORT))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный токен страницы")
+    try:
+        # Одна страница заказов пользователя — диапазон индекса [customer_id, created_at]
+        query, bind_vars = build_my_orders_query(user.id, order_status, cursor_values, page_size)
+        orders = await repo.aql.execute(query, bind_vars=bind_vars)
+
+        cursor_token = next_cursor(orders, MY_ORDERS_SORT, page_size)
+        orders = orders[:page_size]
+        next_url = str(request.url.include_query_params(after=cursor_token)) if cursor_token else None
+        first_url = str(request.url.remove_query_params("after")) if cursor_values is not None else None
+
         return templates.TemplateResponse(
             "orders/my_orders.html",
             {
                 "request": request,
                 "user": user,
                 "orders": orders,
+                "status": order_status,
+                "status_labels": ORDER_STATUS_LABELS,
+                "next_url": next_url,
+                "first_url": first_url,
                 "is_authenticated": True
             }
         )
@@ -530,38 +728,115 @@ async def my_orders(request: Request, user: User = Depends(get_current_user)):
             status_code=500
         )
 
+# Сколько /api/health ждёт ответа БД, прежде чем считать её недоступной
+HEALTH_DB_TIMEOUT_SECONDS = float(os.getenv("HEALTH_DB_TIMEOUT_SECONDS", "2"))
+
+
+async def ping_db() -> dict:
+    """Лёгкий запрос к БД (версия сервера) — доступна ли она прямо сейчас"""
+    if not is_connected():
+        # Подключение устанавливает start_database; проверка здоровья его не открывает,
+        # чтобы частые пробы не занимали потоки пула попытками подключиться
+        return {"reachable": False, "error": "нет подключения к БД"}
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(run_sync(lambda: repo.sync().version()), timeout=HEALTH_DB_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return {"reachable": False, "error": f"нет ответа за {HEALTH_DB_TIMEOUT_SECONDS} с"}
+    except Exception as e:
+        return {"reachable": False, "error": str(e)}
+    return {"reachable": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
 @app.get("/api/health")
 async def health_check():
     try:
-        return {
-            "status": "OK",
-            "db_initialized": bool(db),
-            "users_count": db.collection("users").count() if db and db.has_collection("users") else 0,
-            "products_count": db.collection("products").count() if db and db.has_collection("products") else 0,
-            "orders_count": db.collection("orders").count() if db and db.has_collection("orders") else 0
-        }
+        db = await ping_db()
+        healthy = db["reachable"] and startup_state["ready"]
+        return JSONResponse(
+            status_code=200 if healthy else 503,
+            content={
+                "status": "OK" if healthy else "ERROR",
+                "db": db,
+                "db_initialized": startup_state["ready"],
+                "startup": startup_state,
+                # Счётчики — из материализованной сводки; stats_age_seconds / stats_stale
+                # показывают, насколько они отстают от БД
+                **stats_cache.peek(),
+                "login_pool": password_verifier.stats(),
+                "coordinators": coordinator_pool.stats()
+            }
+        )
     except Exception as e:
-        return {
+        return JSONResponse(status_code=503, content={
             "status": "ERROR",
             "error": str(e)
-        }
+        })
+
+
+@app.get("/api/slow-queries")
+async def slow_query_stats(user: User = Depends(get_current_user)):
+    verify_role(user, ["admin", "superadmin"])
+    return {"threshold_ms": slow_queries.threshold_ms, "top": slow_queries.top()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/cache-stats")
+async def cache_stats(user: User = Depends(get_current_user)):
+    verify_role(user, ["admin", "superadmin"])
+    return {
+        "user_cache": user_cache.stats(),
+        "token_epochs": token_epochs.stats(),
+        "catalog_facets": facet_cache.stats(),
+        "catalog_results": catalog_cache.stats()
+    }
     
 
 # Для пользователей
 @app.get("/admin/users", response_class=HTMLResponse)
-async def admin_users(request: Request, user: User = Depends(get_current_user)):
+async def admin_users(
+        request: Request,
+        user: User = Depends(get_current_user),
+        search: str = Query(""),
+        role: Optional[str] = Query(None),
+        after: Optional[str] = Query(None),
+        page_size: Optional[int] = Query(None)
+):
     verify_role(user, ["admin", "superadmin"])
-    users = list(db.collection("users").find({}))
+    page_size = clamp_page_size(page_size, USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE)
+    if role not in USER_ROLES:
+        role = None
+    try:
+        cursor_values = decode_cursor(after, len(ADMIN_USERS_SORT))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный токен страницы")
+
+    query, bind_vars = build_admin_users_query(search, role, cursor_values, page_size)
+    users = await repo.aql.execute(query, bind_vars=bind_vars)
+
+    cursor_token = next_cursor(users, ADMIN_USERS_SORT, page_size)
+    users = users[:page_size]
+    next_url = str(request.url.include_query_params(after=cursor_token)) if cursor_token else None
+    first_url = str(request.url.remove_query_params("after")) if cursor_values is not None else None
     return templates.TemplateResponse(
         "admin/users.html",
         {
             "request": request,
             "users": users,
+            "search": search,
+            "role": role,
+            "roles": USER_ROLES,
+            "next_url": next_url,
+            "first_url": first_url,
             "user": user,
             "is_authenticated": True
         }
     )
-    
+
 # Маршруты для управления товарами
 @app.get("/admin/products/new", response_class=HTMLResponse)
 async def new_product_form(request: Request, user: User = Depends(get_current_user)):
@@ -635,7 +910,9 @@ async def create_product(
         "created_at": datetime.utcnow().isoformat()
     }
 
-    db.collection("products").insert(product_data)
+    await repo.collection("products").insert(normalize_product(product_data))
+    invalidate_catalog_caches()
+    stats_cache.mark_dirty()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 # Для товаров
@@ -643,19 +920,14 @@ async def create_product(
 async def admin_products(request: Request, user: User = Depends(get_current_user), search: str = ""):
     verify_role(user, ["admin", "superadmin"])
 
-    if search:
-        aql = """
-        FOR p IN products
-            FILTER CONTAINS(LOWER(p.name), LOWER(@search))
-            RETURN p
-        """
-        bind_vars = {"search": search}
+    if search.strip():
+        # Поиск по названию через ArangoSearch, результаты упорядочены по релевантности
+        aql, bind_vars = admin_search_query(search)
     else:
         aql = "FOR p IN products RETURN p"
         bind_vars = {}
 
-    cursor = db.aql.execute(aql, bind_vars=bind_vars)
-    products = list(cursor)
+    products = await repo.aql.execute(aql, bind_vars=bind_vars)
 
     return templates.TemplateResponse(
         "admin/products.html",
@@ -677,8 +949,8 @@ async def admin_products(request: Request, user: User = Depends(get_current_user
 @app.get("/admin/orders/new", response_class=HTMLResponse)
 async def new_order_form(request: Request, user: User = Depends(get_current_user)):
     verify_role(user, ["admin", "superadmin"])
-    products = list(db.collection("products").find({"in_stock": True}))
-    customers = list(db.collection("users").find({"role": "customer"}))
+    products = await repo.collection("products").find({"in_stock": True})
+    customers = await repo.collection("users").find({"role": "customer"})
     return templates.TemplateResponse(
         "admin/new_order.html",
         {
@@ -693,18 +965,96 @@ async def new_order_form(request: Request, user: User = Depends(get_current_user
 
 # Для заказов
 @app.get("/admin/orders", response_class=HTMLResponse)
-async def admin_orders(request: Request, user: User = Depends(get_current_user)):
+async def admin_orders(
+        request: Request,
+        user: User = Depends(get_current_user),
+        order_status: Optional[str] = Query(None, alias="status"),
+        customer_id: Optional[str] = Query(None),
+        product_id: Optional[str] = Query(None),
+        date_from: Optional[str] = Query(None),
+        date_to: Optional[str] = Query(None),
+        sort: Optional[str] = Query(None),
+        after: Optional[str] = Query(None),
+        page_size: Optional[int] = Query(None)
+):
     verify_role(user, ["admin", "superadmin"])
-    orders = list(db.collection("orders").find({}))
+    page_size = clamp_page_size(page_size, ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE)
+    if sort not in ADMIN_ORDER_SORTS:
+        sort = DEFAULT_ADMIN_ORDER_SORT
+    filters = OrderFilters(
+        status=order_status if order_status in ORDER_STATUS_LABELS else None,
+        customer_id=(customer_id or "").strip() or None,
+        product_id=(product_id or "").strip() or None,
+        date_from=parse_date(date_from),
+        date_to=parse_date(date_to)
+    )
+    try:
+        cursor_values = decode_cursor(after, len(ADMIN_ORDER_SORTS[sort]))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный токен страницы")
+
+    query, bind_vars = build_admin_orders_query(filters, sort, cursor_values, page_size)
+    orders = await repo.aql.execute(query, bind_vars=bind_vars)
+
+    cursor_token = next_cursor(orders, ADMIN_ORDER_SORTS[sort], page_size)
+    orders = orders[:page_size]
+    next_url = str(request.url.include_query_params(after=cursor_token)) if cursor_token else None
+    first_url = str(request.url.remove_query_params("after")) if cursor_values is not None else None
     return templates.TemplateResponse(
         "admin/orders.html",
         {
             "request": request,
             "orders": orders,
+            "filters": filters,
+            "sort": sort,
+            "sort_labels": ADMIN_ORDER_SORT_LABELS,
+            "status_labels": ORDER_STATUS_LABELS,
+            "page_size": page_size,
+            "next_url": next_url,
+            "first_url": first_url,
             "user": user,
             "is_authenticated": True
         }
     )
+# Аналитика продаж — читает только агрегаты sales_daily / sales_by_product
+ANALYTICS_DAYS = 30
+ANALYTICS_MONTHS = 12
+ANALYTICS_TOP_PRODUCTS = 20
+
+
+@app.get("/admin/analytics", response_class=HTMLResponse)
+async def admin_analytics(request: Request, user: User = Depends(get_current_user)):
+    verify_role(user, ["admin", "superadmin"])
+    since = (datetime.utcnow() - timedelta(days=ANALYTICS_DAYS)).date().isoformat()
+    daily, monthly, top_products, materials = await asyncio.gather(
+        repo.aql.execute(DAILY_REPORT_AQL, bind_vars={"since": since}),
+        repo.aql.execute(MONTHLY_REPORT_AQL, bind_vars={"limit": ANALYTICS_MONTHS}),
+        repo.aql.execute(TOP_PRODUCTS_AQL, bind_vars={"limit": ANALYTICS_TOP_PRODUCTS}),
+        repo.aql.execute(MATERIAL_REPORT_AQL)
+    )
+    return templates.TemplateResponse(
+        "admin/analytics.html",
+        {
+            "request": request,
+            "user": user,
+            "is_authenticated": True,
+            "daily": daily,
+            "monthly": monthly,
+            "top_products": top_products,
+            "materials": materials,
+            "days": ANALYTICS_DAYS,
+            "rebuilt": request.query_params.get("rebuilt")
+        }
+    )
+
+
+@app.post("/admin/analytics/rebuild")
+async def admin_analytics_rebuild(user: User = Depends(get_current_user)):
+    verify_role(user, ["superadmin"])
+    result = await run_sync(lambda: rebuild_rollups(repo.sync()))
+    return RedirectResponse(url=f"/admin/analytics?rebuilt={result['elapsed_ms']}", status_code=303)
+
+
 # Маршруты для управления пользователями
 @app.get("/admin/users/new", response_class=HTMLResponse)
 async def new_user_form(request: Request, user: User = Depends(get_current_user)):
@@ -745,11 +1095,12 @@ async def change_user_role(
         )
 
     try:
-        user = db.collection("users").get(f"users/{user_key}")
+        user = await repo.collection("users").get(f"users/{user_key}")
         if not user:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-        db.collection("users").update_match({"_key": user_key}, {"role": new_role})
+        await repo.collection("users").update({"_key": user_key, "role": new_role}, check_rev=False)
+        await bump_token_epoch(user_key)
         return {"status": "ok", "new_role": new_role}
 
     except ArangoError as e:
@@ -760,67 +1111,106 @@ async def change_user_role(
         )
 
 
+# Размер пачки курсора при выгрузке
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
 @app.get("/admin/export")
-async def export_data(user: User = Depends(get_current_user)):
+async def export_data(
+    user: User = Depends(get_current_user),
+    format: str = Query("json"),
+    gzip: bool = Query(False),
+    collections: Optional[str] = Query(None),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000)
+):
     verify_role(user, ["admin", "superadmin"])
 
-    try:
-        # Собираем все данные
-        data = {
-            "products": list(db.collection("products").all()),
-            "orders": list(db.collection("orders").all()),
-            "users": list(db.collection("users").all()),
-            "measurements": list(db.collection("measurements").all()),
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Неподдерживаемый формат выгрузки")
+
+    selected = EXPORT_COLLECTIONS
+    if collections:
+        selected = [name.strip() for name in collections.split(",") if name.strip()]
+        if not selected or any(name not in EXPORT_COLLECTIONS for name in selected):
+            raise HTTPException(status_code=400, detail="Недопустимый список коллекций")
+
+    # Документы пишутся в ответ по мере чтения из курсора, память не зависит от размера БД
+    chunks = export_chunks(repo, selected, format, batch_size)
+    filename = f"export.{format}"
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
         }
-
-        # Преобразуем в JSON
-        json_data = json.dumps(data, ensure_ascii=False, indent=2)
-
-        # Создаем поток для ответа
-        buffer = BytesIO()
-        buffer.write(json_data.encode("utf-8"))
-        buffer.seek(0)
-
-        return StreamingResponse(
-            buffer,
-            media_type="application/json",
-            headers={
-                "Content-Disposition": "attachment; filename=export.json"
-            }
-        )
-    except Exception as e:
-        print(f"Ошибка экспорта: {e}")
-        raise HTTPException(status_code=500, detail="Ошибка экспорта данных")
+    )
 
 
 @app.post("/admin/import")
 async def import_all_data(
     user: User = Depends(get_current_user),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    on_duplicate: str = Form("replace")
 ):
     verify_role(user, ["admin", "superadmin"])
 
-    try:
-        content = await file.read()
-        data = json.loads(content)
-
-        total_inserted = 0
-        for collection_name in ["products", "orders", "users"]:
-            if collection_name in data:
-                for item in data[collection_name]:
-                    db.collection(collection_name).insert(item, overwrite=True)
-                    total_inserted += 1
+    if on_duplicate not in ON_DUPLICATE_POLICIES:
+        raise HTTPException(status_code=400, detail="Недопустимая политика on_duplicate")
 
-        # Передаём количество импортированных объектов через query string
-        return RedirectResponse(f"/admin/dashboard?imported={total_inserted}", status_code=303)
+    try:
+        # Файл сохраняется на диск, разбор и запись идут в фоне пачками import_bulk
+        path = await spool_upload(file)
+        job = start_import(path, file.filename or "import.json", on_duplicate, on_finished=import_finished)
+        return RedirectResponse(f"/admin/dashboard?import_job={job.id}", status_code=303)
 
     except Exception as e:
         print(f"Ошибка импорта данных: {e}")
         raise HTTPException(status_code=400, detail="Ошибка импорта данных")
 
 
+def import_finished(job: ImportJob):
+    """Сбрасывает кэши коллекций, в которые писал импорт"""
+    if "users" in job.report.per_collection:
+        user_cache.clear()
+        token_epochs.clear()
+    if "products" in job.report.per_collection:
+        invalidate_catalog_caches()
+    if "orders" in job.report.per_collection:
+        # Вызывается в потоке импорта — пересчёт агрегатов не держит event loop
+        try:
+            rebuild_rollups(repo.sync())
+        except Exception as e:
+            # Документы уже загружены, но отчёты по ним неверны, пока агрегаты не
+            # пересчитают заново (/admin/analytics/rebuild)
+            print(f"Ошибка пересчёта агрегатов после импорта {job.id}: {e}")
+            job.status = "failed"
+            # Ошибку самого импорта, если она была, не затираем
+            job.error = job.error or f"Данные загружены, но пересчёт агрегатов не выполнен: {e}"
+    stats_cache.mark_dirty()
+
+
+@app.get("/admin/import/{job_id}")
+async def import_status(job_id: str, user: User = Depends(get_current_user)):
+    verify_role(user, ["admin", "superadmin"])
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание импорта не найдено")
+    return job.as_dict()
+
+
 @app.get("/entities/{entity_type}/", response_class=HTMLResponse)
-async def list_entities(request: Request, entity_type: str, user: User = Depends(get_current_user)):
+async def list_entities(
+        request: Request,
+        entity_type: str,
+        user: User = Depends(get_current_user),
+        after: Optional[str] = Query(None),
+        page_size: Optional[int] = Query(None)
+):
     if not user:
         print("Redirecting to /login — user is None")
         return RedirectResponse("/login")
@@ -828,16 +1218,30 @@ async def list_entities(request: Request, entity_type: str, user: User = Depends
     verify_role(user, ["superadmin"])
 
     # Проверяем, что entity_type поддерживается
-    allowed = ["users", "products", "orders", "measurements", "photos"]
-    if entity_type not in allowed:
+    if entity_type not in ENTITY_TYPES:
         return HTMLResponse("Entity type not supported", status_code=400)
 
-    collection = db.collection(entity_type)
-    entities = list(collection.all())
+    page_size = clamp_page_size(page_size, ENTITY_PAGE_SIZE, ENTITY_MAX_PAGE_SIZE)
+    try:
+        cursor_values = decode_cursor(after, 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный токен страницы")
+
+    # Читаем страницу из потокового курсора пачками — сервер не материализует выборку целиком
+    query, bind_vars = build_entity_page_query(entity_type, cursor_values[0] if cursor_values else None, page_size)
+    entities = []
+    async for batch in repo.aql.stream(query, bind_vars, batch_size=page_size + 1):
+        entities.extend(batch)
+
+    cursor_token = next_cursor(entities, [("_key", "ASC")], page_size)
+    entities = entities[:page_size]
+    next_url = str(request.url.include_query_params(after=cursor_token)) if cursor_token else None
+    first_url = str(request.url.remove_query_params("after")) if cursor_values is not None else None
 
     return templates.TemplateResponse(
         "entities/list.html",
-        {"request": request, "entities": entities, "entity_type": entity_type, "user": user , "is_authenticated": True}
+        {"request": request, "entities": entities, "entity_type": entity_type, "user": user , "is_authenticated": True,
+         "next_url": next_url, "first_url": first_url}
     )
 @app.get("/entities/{entity_type}/{entity_id}/edit", response_class=HTMLResponse)
 async def edit_entity_form(request: Request, entity_type: str, entity_id: str, user: User = Depends(get_current_user)):
@@ -846,8 +1250,7 @@ async def edit_entity_form(request: Request, entity_type: str, entity_id: str, u
         return RedirectResponse("/login")
     print(f"User role: {user.role}")
     verify_role(user, ["superadmin"])
-    collection = db.collection(entity_type)
-    entity = collection.get(entity_id)
+    entity = await repo.collection(entity_type).get(entity_id)
     return templates.TemplateResponse("entities/edit.html", {"request": request, "entity": entity, "entity_type": entity_type , "user": user ,"is_authenticated": True})
 
 
@@ -863,10 +1266,40 @@ async def entity_edit(request: Request, entity_type: str, item_id: str, user: Us
     form = await request.form()
     data = dict(form)
 
-    if entity_type not in ["users", "products", "orders", "measurements",  "photos"]:
+    if entity_type not in ENTITY_TYPES:
         return HTMLResponse("Тип сущности не найден", status_code=404)
 
-    db.collection(entity_type).update_match({"_key": item_id}, data)
+    # Служебные поля из формы не передаём: документ обновляется по _key из адреса
+    data.pop("_id", None)
+    data.pop("_rev", None)
+    data["_key"] = item_id
+
+    if entity_type == "users":
+        # Эпоху меняет только bump_token_epoch, значение из формы не принимаем
+        data.pop("token_epoch", None)
+    if entity_type == "products":
+        # Нормализованные поля не редактируются вручную — пересчитываем из material / color
+        data.pop("material_lc", None)
+        data.pop("color_lc", None)
+        normalize_product(data)
+    if entity_type == "orders":
+        # Смена статуса (например, отмена) или суммы заказа переносит его вклад в агрегатах
+        # в той же транзакции, что и сама правка
+        if await run_sync(update_order, repo.sync(), data) is None:
+            return HTMLResponse("Документ не найден", status_code=404)
+    else:
+        try:
+            await repo.collection(entity_type).update(data, check_rev=False)
+        except DocumentUpdateError as e:
+            # Документ удалили, или в адресе чужой ключ
+            if e.http_code == 404:
+                return HTMLResponse("Документ не найден", status_code=404)
+            raise
+    stats_cache.mark_dirty()
+    if entity_type == "users":
+        await bump_token_epoch(item_id)
+    elif entity_type == "products":
+        invalidate_catalog_caches()
 
     return RedirectResponse(url=f"/entities/{entity_type}/", status_code=303)
 
@@ -878,7 +1311,7 @@ async def choose_entity_type(request: Request, user: User = Depends(get_current_
         return RedirectResponse("/login")
     print(f"User role: {user.role}")
     verify_role(user, ["superadmin"])
-    entity_types = ["users", "products", "orders", "measurements",  "photos"]
+    entity_types = ENTITY_TYPES
     return templates.TemplateResponse("entities/choose_type.html", {"request": request, "entity_types": entity_types, "user": user, "is_authenticated": True})
 
 
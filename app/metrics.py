@@ -0,0 +1,179 @@
+"""Метрики приложения в текстовом формате Prometheus (/metrics).
+
+HTTP: задержка по маршрутам (гистограмма), коды ответов, запросы в обработке.
+ArangoDB: число и длительность обращений по видам (aql, cursor, read, write, other),
+а также сколько обращений к БД и сколько времени в ней пришлось на один HTTP-запрос —
+так видны N+1-запросы отдельных маршрутов.
+"""
+import contextvars
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_CALLS_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+DB_REQUEST_KINDS = ("aql", "cursor", "read", "write", "other")
+
+
+class RequestDBStats:
+    """Обращения к БД в рамках одного HTTP-запроса; пополняется из потоков пула БД"""
+
+    def __init__(self):
+        self.calls = dict.fromkeys(DB_REQUEST_KINDS, 0)
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            self.calls[kind] += 1
+            self.seconds += seconds
+
+
+# Статистика текущего запроса; run_sync копирует контекст в поток пула, поэтому клиент БД её видит
+current_request_db: contextvars.ContextVar[Optional[RequestDBStats]] = contextvars.ContextVar(
+    "current_request_db", default=None
+)
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in items) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Sequence[float]] = None):
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def add_gauge(self, name: str, labels: Labels = (), value: float = 1):
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in sorted(series.items()):
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.total}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("http_requests_total", "HTTP-запросы по маршруту, методу и коду ответа")
+metrics.describe("http_requests_in_flight", "HTTP-запросы в обработке")
+metrics.describe("http_request_duration_seconds", "Время обработки HTTP-запроса", LATENCY_BUCKETS)
+metrics.describe("http_request_db_calls", "Обращений к ArangoDB на один HTTP-запрос", DB_CALLS_BUCKETS)
+metrics.describe("http_request_db_seconds", "Время в ArangoDB на один HTTP-запрос", LATENCY_BUCKETS)
+metrics.describe("arangodb_requests_total", "Обращения к ArangoDB по видам")
+metrics.describe("arangodb_request_duration_seconds", "Длительность обращения к ArangoDB", LATENCY_BUCKETS)
+
+
+def classify_db_request(method: str, url: str) -> str:
+    """Вид обращения к ArangoDB по методу и пути REST API"""
+    path = url.split("?", 1)[0]
+    if "/_api/cursor" in path:
+        # POST создаёт курсор (выполняет AQL), остальное — дочитывание и закрытие
+        return "aql" if method.upper() == "POST" and path.rstrip("/").endswith("/_api/cursor") else "cursor"
+    if "/_api/document" in path:
+        return "read" if method.upper() in ("GET", "HEAD") else "write"
+    if "/_api/import" in path:
+        return "write"
+    return "other"
+
+
+def observe_db_request(method: str, url: str, seconds: float):
+    kind = classify_db_request(method, url)
+    labels = _labels(kind=kind)
+    metrics.inc("arangodb_requests_total", labels)
+    metrics.observe("arangodb_request_duration_seconds", labels, seconds)
+    request_stats = current_request_db.get()
+    if request_stats is not None:
+        request_stats.add(kind, seconds)
+
+
+def begin_request() -> Tuple[RequestDBStats, contextvars.Token, float]:
+    # Маршрут ещё не известен до маршрутизации, поэтому счётчик обрабатываемых запросов общий
+    metrics.add_gauge("http_requests_in_flight", (), 1)
+    stats = RequestDBStats()
+    return stats, current_request_db.set(stats), time.perf_counter()
+
+
+def end_request(method: str, route: str, status: int, stats: RequestDBStats,
+                token: contextvars.Token, started: float):
+    elapsed = time.perf_counter() - started
+    current_request_db.reset(token)
+    metrics.add_gauge("http_requests_in_flight", (), -1)
+    metrics.inc("http_requests_total", _labels(method=method, route=route, status=str(status)))
+    route_labels = _labels(method=method, route=route)
+    metrics.observe("http_request_duration_seconds", route_labels, elapsed)
+    for kind, calls in stats.calls.items():
+        metrics.observe("http_request_db_calls", _labels(method=method, route=route, kind=kind), calls)
+    metrics.observe("http_request_db_seconds", route_labels, stats.seconds)
@@ -0,0 +1,250 @@
+import time
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from arango.database import StandardDatabase
+from arango.exceptions import DocumentInsertError
+
+from .analytics import rebuild_rollups
+
+
+# Коллекция с метаданными схемы: применённая версия и блокировка миграций
+META_COLLECTION = "schema_meta"
+SCHEMA_KEY = "schema"
+LOCK_KEY = "migration_lock"
+# Блокировка, не снятая за это время (упавший процесс), считается брошенной
+LOCK_TIMEOUT_SECONDS = 600
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[StandardDatabase], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Регистрирует шаг миграции схемы; версии должны строго возрастать"""
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+def add_index(db: StandardDatabase, collection: str, fields: List[str], index_type: str = "persistent", **options):
+    """Создаёт индекс в фоне; существующий индекс с теми же полями ArangoDB просто вернёт"""
+    data = {"type": index_type, "fields": fields, "inBackground": True}
+    data.update(options)
+    return db.collection(collection).add_index(data)
+
+
+# Коллекции приложения; используются миграциями и загрузчиком данных
+DOCUMENT_COLLECTIONS = [
+    "users",        # Пользователи системы
+    "products",     # Оконные конструкции
+    "orders",       # Заказы клиентов
+    "measurements", # Замеры
+    "photos"        # Фотографии товаров
+]
+
+EDGE_COLLECTIONS = [
+    ("created_order", "users", "orders"),       # Пользователь создал заказ
+    ("contain_product", "orders", "products"),  # Заказ содержит товары
+    ("product_photos", "products", "photos"),   # Товар имеет фотографии
+    ("assigned_measurement", "users", "measurements"),  # Замерщик назначен на замер
+    ("user_orders", "users", "orders")          # Заказы, оформленные пользователем
+]
+
+
+@migration(1, "Основные коллекции и edge-коллекции")
+def create_collections(db: StandardDatabase):
+    for col_name in DOCUMENT_COLLECTIONS:
+        if not db.has_collection(col_name):
+            db.create_collection(col_name)
+            print(f"Создана коллекция: {col_name}")
+
+    for edge_name, from_col, to_col in EDGE_COLLECTIONS:
+        if not db.has_collection(edge_name):
+            db.create_collection(edge_name, edge=True)
+            print(f"Создана edge-коллекция: {edge_name} ({from_col} -> {to_col})")
+
+
+@migration(2, "Индексы users и products")
+def create_base_indexes(db: StandardDatabase):
+    add_index(db, "users", ["phone_number"], unique=True)
+    # Список пользователей в админке — порядок (last_name, first_name, _key), см.
+    # users.ADMIN_USERS_SORT; с фильтром по роли — тот же порядок после равенства
+    add_index(db, "users", ["role", "last_name", "first_name", "_key"])
+    add_index(db, "users", ["last_name", "first_name", "_key"])
+
+    # Сортировки каталога с keyset-пагинацией заканчиваются на _key; оптимизатор
+    # берёт индекс для SORT, только если все поля сортировки — префикс полей индекса
+    add_index(db, "products", ["name", "_key"])
+    add_index(db, "products", ["material"])
+    add_index(db, "products", ["price", "_key"])
+    add_index(db, "products", ["description"], index_type="fulltext")
+
+
+@migration(3, "Индекс products.created_at для сортировки каталога")
+def create_catalog_sort_indexes(db: StandardDatabase):
+    add_index(db, "products", ["created_at", "_key"])
+
+
+# Полнотекстовый поиск по каталогу: анализаторы и ArangoSearch-представление
+PRODUCT_SEARCH_VIEW = "products_search"
+NORM_ANALYZER = "windowshop_norm"
+NGRAM_ANALYZER = "windowshop_ngram"
+PRODUCT_TEXT_FIELDS = ["name", "material", "color", "description"]
+PRODUCT_VALUE_FIELDS = ["price", "width", "height", "in_stock", "created_at"]
+
+
+@migration(4, "ArangoSearch-представление products_search с n-gram анализатором (ru)")
+def create_product_search_view(db: StandardDatabase):
+    norm = {"locale": "ru", "case": "lower", "accent": False}
+    # Нормализованное значение целиком — для LIKE по коротким (< 3 символов) запросам
+    db.create_analyzer(NORM_ANALYZER, "norm", norm, ["frequency", "norm", "position"])
+    # Триграммы нормализованного текста — поиск подстроки через NGRAM_MATCH
+    db.create_analyzer(
+        NGRAM_ANALYZER,
+        "pipeline",
+        {"pipeline": [
+            {"type": "norm", "properties": norm},
+            {"type": "ngram", "properties": {"min": 3, "max": 3, "preserveOriginal": False, "streamType": "utf8"}}
+        ]},
+        ["frequency", "norm", "position"]
+    )
+
+    fields = {name: {"analyzers": [NGRAM_ANALYZER, NORM_ANALYZER]} for name in PRODUCT_TEXT_FIELDS}
+    fields.update({name: {"analyzers": ["identity"]} for name in PRODUCT_VALUE_FIELDS})
+    links = {"products": {"fields": fields, "includeAllFields": False}}
+
+    if any(view["name"] == PRODUCT_SEARCH_VIEW for view in db.views()):
+        db.update_arangosearch_view(PRODUCT_SEARCH_VIEW, {"links": links})
+    else:
+        db.create_arangosearch_view(PRODUCT_SEARCH_VIEW, {"links": links})
+
+
+# Нормализованные поля товара для точных фильтров каталога (см. catalog.normalize_product)
+PRODUCT_NORMALIZED_FIELDS = ["material_lc", "color_lc"]
+
+
+@migration(5, "Нормализованные material_lc/color_lc и составные индексы фильтров каталога")
+def create_product_filter_indexes(db: StandardDatabase):
+    db.aql.execute(
+        "FOR p IN products "
+        "UPDATE p WITH {material_lc: p.material == null ? null : LOWER(TRIM(p.material)), "
+        "color_lc: p.color == null ? null : LOWER(TRIM(p.color))} IN products"
+    )
+    # Равенства по нормализованным полям, затем диапазон цены — и фильтр, и сортировка по цене
+    add_index(db, "products", ["material_lc", "color_lc", "price", "_key"])
+    add_index(db, "products", ["material_lc", "price", "_key"])
+    add_index(db, "products", ["color_lc", "price", "_key"])
+
+    fields = {name: {"analyzers": [NGRAM_ANALYZER, NORM_ANALYZER]} for name in PRODUCT_TEXT_FIELDS}
+    fields.update({name: {"analyzers": ["identity"]} for name in PRODUCT_VALUE_FIELDS + PRODUCT_NORMALIZED_FIELDS})
+    db.update_arangosearch_view(
+        PRODUCT_SEARCH_VIEW,
+        {"links": {"products": {"fields": fields, "includeAllFields": False}}}
+    )
+
+
+@migration(6, "Индексы orders для истории заказов покупателя")
+def create_customer_order_indexes(db: StandardDatabase):
+    # Страница /my-orders — диапазон индекса в порядке (created_at, _key), с фильтром
+    # по статусу и без; см. orders.MY_ORDERS_SORT
+    add_index(db, "orders", ["customer_id", "created_at", "_key"])
+    add_index(db, "orders", ["customer_id", "status", "created_at", "_key"])
+
+
+@migration(7, "Индексы orders для таблицы заказов в админке")
+def create_admin_order_indexes(db: StandardDatabase):
+    # Сортировки orders.ADMIN_ORDER_SORTS заканчиваются на _key
+    add_index(db, "orders", ["created_at", "_key"])
+    add_index(db, "orders", ["status", "created_at", "_key"])
+    add_index(db, "orders", ["product_id", "created_at", "_key"])
+    add_index(db, "orders", ["total_price", "_key"])
+
+
+@migration(8, "Индексы users для поиска по префиксу в админке")
+def create_user_search_indexes(db: StandardDatabase):
+    # Фамилия и телефон уже покрыты индексами миграции 2
+    add_index(db, "users", ["first_name"])
+    add_index(db, "users", ["username"], sparse=True)
+
+
+@migration(9, "Агрегаты продаж sales_daily / sales_by_product")
+def create_sales_rollups(db: StandardDatabase):
+    # Коллекции создаются пересчётом; на уже заполненной базе он же делает начальное заполнение
+    rebuild_rollups(db)
+
+
+def applied_version(db: StandardDatabase) -> int:
+    if not db.has_collection(META_COLLECTION):
+        return 0
+    schema = db.collection(META_COLLECTION).get(SCHEMA_KEY)
+    return schema["version"] if schema else 0
+
+
+def schema_is_current(db: StandardDatabase) -> bool:
+    """Применены ли все зарегистрированные шаги миграции"""
+    return applied_version(db) >= max(m.version for m in MIGRATIONS)
+
+
+def _acquire_lock(meta) -> bool:
+    now = time.time()
+    try:
+        meta.insert({"_key": LOCK_KEY, "expires_at": now + LOCK_TIMEOUT_SECONDS})
+        return True
+    except DocumentInsertError:
+        lock = meta.get(LOCK_KEY)
+        if lock and lock.get("expires_at", 0) < now:
+            # Предыдущий процесс не снял блокировку — забираем её, проверяя _rev
+            meta.replace(
+                {"_key": LOCK_KEY, "_rev": lock["_rev"], "expires_at": now + LOCK_TIMEOUT_SECONDS},
+                check_rev=True
+            )
+            return True
+        return False
+
+
+def migrate(db: StandardDatabase) -> List[int]:
+    """Применяет ещё не выполненные шаги миграции и возвращает их версии"""
+    if not db.has_collection(META_COLLECTION):
+        db.create_collection(META_COLLECTION)
+    meta = db.collection(META_COLLECTION)
+
+    current = applied_version(db)
+    pending = [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version > current]
+    if not pending:
+        return []
+
+    if not _acquire_lock(meta):
+        print("[INFO] Миграции уже выполняет другой процесс — пропускаем")
+        return []
+
+    applied = []
+    try:
+        # Версию перечитываем под блокировкой: её мог поднять другой процесс
+        current = applied_version(db)
+        for step in pending:
+            if step.version <= current:
+                continue
+            started = time.perf_counter()
+            step.apply(db)
+            meta.insert(
+                {
+                    "_key": SCHEMA_KEY,
+                    "version": step.version,
+                    "description": step.description,
+                    "applied_at": datetime.utcnow().isoformat()
+                },
+                overwrite=True
+            )
+            applied.append(step.version)
+            print(f"[INFO] Миграция {step.version} ({step.description}) "
+                  f"выполнена за {(time.perf_counter() - started) * 1000:.0f} мс")
+    finally:
+        meta.delete(LOCK_KEY, ignore_missing=True)
+    return applied
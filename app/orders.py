@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from .analytics import ROLLUP_UPSERT_AQL, product_key, rollup_bind_vars
+from .pagination import SortKey, keyset_filter, sort_clause
+
+
+# Статусы заказов и их подписи в интерфейсе
+ORDER_STATUS_LABELS = {
+    "new": "Новый",
+    "processing": "В обработке",
+    "waiting_payment": "Ожидает оплаты",
+    "paid_online": "Оплачен онлайн",
+    "paid_crypto": "Оплачен криптовалютой",
+    "completed": "Выполнен",
+    "cancelled": "Отменен",
+}
+
+# История заказов покупателя: от новых к старым, порядок совпадает
+# с индексами [customer_id, created_at, _key] и [customer_id, status, created_at, _key]
+MY_ORDERS_SORT: List[SortKey] = [("created_at", "DESC"), ("_key", "DESC")]
+
+MY_ORDERS_FIELDS = ["_key", "product_name", "quantity", "address", "status", "total_price", "created_at", "comments"]
+
+
+def build_my_orders_query(customer_id: str, status: Optional[str], after: Optional[List[Any]],
+                          page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """AQL одной страницы заказов покупателя с необязательным фильтром по статусу"""
+    conditions = ["o.customer_id == @customer_id"]
+    bind_vars: Dict[str, Any] = {"customer_id": customer_id, "page_limit": page_size + 1}
+    if status:
+        conditions.append("o.status == @status")
+        bind_vars["status"] = status
+    if after is not None:
+        condition, cursor_vars = keyset_filter("o", MY_ORDERS_SORT, after)
+        conditions.append(condition)
+        bind_vars.update(cursor_vars)
+
+    fields = ", ".join(f"{field}: o.{field}" for field in MY_ORDERS_FIELDS)
+    query = (f"FOR o IN orders FILTER {' AND '.join(conditions)} "
+             f"{sort_clause('o', MY_ORDERS_SORT)} LIMIT @page_limit RETURN {{{fields}}}")
+    return query, bind_vars
+
+
+class OrderFilters(BaseModel):
+    status: Optional[str] = None
+    customer_id: Optional[str] = None
+    product_id: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+
+# Сортировки таблицы заказов в админке; у каждой есть свой индекс (см. миграцию 7)
+ADMIN_ORDER_SORTS: Dict[str, List[SortKey]] = {
+    "-created_at": [("created_at", "DESC"), ("_key", "DESC")],
+    "created_at": [("created_at", "ASC"), ("_key", "ASC")],
+    "-total_price": [("total_price", "DESC"), ("_key", "DESC")],
+    "total_price": [("total_price", "ASC"), ("_key", "ASC")],
+}
+ADMIN_ORDER_SORT_LABELS = {
+    "-created_at": "Сначала новые",
+    "created_at": "Сначала старые",
+    "-total_price": "Сначала дорогие",
+    "total_price": "Сначала дешёвые",
+}
+DEFAULT_ADMIN_ORDER_SORT = "-created_at"
+
+# Только колонки таблицы admin/orders.html — без адресов, комментариев и прочего
+ADMIN_ORDER_FIELDS = ["_key", "customer_id", "customer_name", "product_id", "product_name",
+                      "quantity", "total_price", "status", "created_at"]
+
+
+def build_admin_orders_query(filters: OrderFilters, sort: str, after: Optional[List[Any]],
+                             page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """AQL одной страницы заказов для админки: фильтры, keyset-продолжение и проекция"""
+    conditions = []
+    bind_vars: Dict[str, Any] = {"page_limit": page_size + 1}
+    # Равенства перед диапазоном дат — как в индексах [status|customer_id|product_id, created_at, _key]
+    for field in ("status", "customer_id", "product_id"):
+        value = getattr(filters, field)
+        if value:
+            conditions.append(f"o.{field} == @{field}")
+            bind_vars[field] = value
+    # created_at хранится строкой ISO 8601, поэтому границы дат сравниваются как строки
+    if filters.date_from:
+        conditions.append("o.created_at >= @date_from")
+        bind_vars["date_from"] = filters.date_from.isoformat()
+    if filters.date_to:
+        conditions.append("o.created_at < @date_to")
+        bind_vars["date_to"] = (filters.date_to + timedelta(days=1)).isoformat()
+
+    keys = ADMIN_ORDER_SORTS[sort]
+    if after is not None:
+        condition, cursor_vars = keyset_filter("o", keys, after)
+        conditions.append(condition)
+        bind_vars.update(cursor_vars)
+
+    query = "FOR o IN orders"
+    if conditions:
+        query += " FILTER " + " AND ".join(conditions)
+    fields = ", ".join(f"{field}: o.{field}" for field in ADMIN_ORDER_FIELDS)
+    query += f" {sort_clause('o', keys)} LIMIT @page_limit RETURN {{{fields}}}"
+    return query, bind_vars
+
+
+# Создание заказа одним запросом: цена товара, сам заказ, рёбра user_orders и contain_product
+# и приращение агрегатов продаж. AQL-запрос выполняется как одна транзакция, поэтому
+# заказ без рёбер или без учёта в агрегатах не появится. Если товара нет, FOR по products
+# не даст ни одной строки — запрос ничего не запишет и вернёт пустой результат
+CREATE_ORDER_AQL = """
+FOR product IN products
+    FILTER product._key == @product_key
+    LET total_price = product.price * @quantity
+    INSERT MERGE(@order, {product_id: product._key, product_name: product.name, total_price})
+        INTO orders
+    LET new_order = NEW
+    INSERT {_from: CONCAT("users/", @customer_key), _to: new_order._id, type: "created", created_at: @now}
+        INTO user_orders
+    INSERT {_from: new_order._id, _to: product._id, quantity: @quantity, created_at: @now}
+        INTO contain_product
+    LET rollup_revenue = total_price
+""" + ROLLUP_UPSERT_AQL + """
+    RETURN {_key: new_order._key, total_price}
+"""
+
+
+def create_order_query(order: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """AQL создания заказа; product_name и total_price проставляются по товару на сервере"""
+    bind_vars = rollup_bind_vars(order, 1)
+    # Выручка считается в запросе, bind var для неё не нужен
+    del bind_vars["rollup_revenue"]
+    bind_vars.update(
+        order=order,
+        product_key=product_key(order["product_id"]),
+        quantity=order["quantity"],
+        customer_key=order["customer_id"],
+        now=order["created_at"],
+    )
+    return CREATE_ORDER_AQL, bind_vars
@@ -0,0 +1,65 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Ключ сортировки: (поле документа, направление "ASC" | "DESC")
+SortKey = Tuple[str, str]
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Кодирует значения ключей последней строки страницы в непрозрачный токен"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str], size: int) -> Optional[List[Any]]:
+    """Разбирает токен страницы; битый или чужой токен даёт ValueError"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный токен страницы")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Некорректный токен страницы")
+    return values
+
+
+def keyset_filter(var: str, keys: List[SortKey], values: List[Any], prefix: str = "after") -> Tuple[str, Dict[str, Any]]:
+    """Условие «строго после values» в порядке сортировки keys.
+
+    Для ключей (a ASC, _key ASC) получается
+    d.a >= @after0 AND (d.a > @after0 OR (d.a == @after0 AND d._key > @after1)).
+    Первое условие следует из второго, но только оно задаёт оптимизатору границу
+    диапазона индекса — иначе каждая следующая страница просматривает индекс с начала.
+    """
+    bind_vars = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    branches = []
+    for i, (field, direction) in enumerate(keys):
+        op = ">" if direction == "ASC" else "<"
+        parts = [f"{var}.{keys[j][0]} == @{prefix}{j}" for j in range(i)]
+        parts.append(f"{var}.{field} {op} @{prefix}{i}")
+        branches.append("(" + " AND ".join(parts) + ")")
+    first_field, first_direction = keys[0]
+    bound = f"{var}.{first_field} {'>=' if first_direction == 'ASC' else '<='} @{prefix}0"
+    return "(" + bound + " AND (" + " OR ".join(branches) + "))", bind_vars
+
+
+def sort_clause(var: str, keys: List[SortKey]) -> str:
+    return "SORT " + ", ".join(f"{var}.{field} {direction}" for field, direction in keys)
+
+
+def clamp_page_size(value: Optional[int], default: int, maximum: int) -> int:
+    if not value or value < 1:
+        return default
+    return min(value, maximum)
+
+
+def next_cursor(rows: List[dict], keys: List[SortKey], page_size: int) -> Optional[str]:
+    """Токен следующей страницы; rows запрашиваются с запасом в одну строку"""
+    if len(rows) <= page_size:
+        return None
+    last = rows[page_size - 1]
+    return encode_cursor([last.get(field) for field, _ in keys])
@@ -0,0 +1,141 @@
+"""Реестр форм AQL-запросов приложения с типичными bind vars.
+
+Каждый вариант строится теми же функциями, что и маршруты (build_catalog_query,
+build_admin_orders_query и т.д.), поэтому изменение построителя сразу попадает
+в проверку планов: scripts/check_query_plans.py выполняет EXPLAIN для каждого
+варианта на базе с синтетическими данными и сравнивает оценку стоимости с базовой.
+"""
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from .analytics import (DAILY_REPORT_AQL, MATERIAL_REPORT_AQL, MONTHLY_REPORT_AQL, TOP_PRODUCTS_AQL,
+                        rollup_delta_query)
+from .catalog import ProductFilters, admin_search_query, build_catalog_query, build_facet_query
+from .entities import ENTITY_PAGE_SIZE, ENTITY_TYPES, build_entity_page_query
+from .orders import OrderFilters, build_admin_orders_query, build_my_orders_query, create_order_query
+from .stats import STATS_QUERY
+from .users import build_admin_users_query
+
+
+class QueryCase(NamedTuple):
+    name: str
+    query: str
+    bind_vars: Dict[str, Any]
+    # Коллекции, которые запрос по своей сути читает целиком (выгрузки, сводки по всем
+    # документам) — полный просмотр в них не считается ошибкой плана
+    full_scans: Tuple[str, ...] = ()
+    # Коллекции, сортировка которых в памяти перед LIMIT ожидаема: индекс её не обслужит
+    memory_sorts: Tuple[str, ...] = ()
+
+
+# Размеры страниц — как значения по умолчанию в main.py
+CATALOG_PAGE = 24
+ORDERS_PAGE = 20
+USERS_PAGE = 50
+
+# Значения bind vars берутся из тех же диапазонов, что и синтетические данные
+# scripts/check_query_plans.py: товары p<N>, покупатели u<N>, заказы o<N>
+SAMPLE_PRODUCT = "p17"
+SAMPLE_CUSTOMER = "u42"
+SAMPLE_DAY = "2025-03-01"
+
+
+def _case(name: str, built: Tuple[str, Dict[str, Any]], full_scans: Tuple[str, ...] = (),
+          memory_sorts: Tuple[str, ...] = ()) -> QueryCase:
+    query, bind_vars = built
+    return QueryCase(name, query, bind_vars, full_scans, memory_sorts)
+
+
+def catalog_cases() -> List[QueryCase]:
+    return [
+        _case("catalog.default", build_catalog_query(ProductFilters(), "name", None, CATALOG_PAGE)),
+        _case("catalog.next_page", build_catalog_query(ProductFilters(), "name", ["Окно 100", "p100"], CATALOG_PAGE)),
+        _case("catalog.newest", build_catalog_query(ProductFilters(), "-created_at", None, CATALOG_PAGE)),
+        _case("catalog.material_color_price",
+              build_catalog_query(ProductFilters(material="ПВХ", color="Белый"), "price", None, CATALOG_PAGE)),
+        _case("catalog.material_price_range",
+              build_catalog_query(ProductFilters(material="Дерево", min_price=20000, max_price=60000),
+                                  "-price", [50000, "p900"], CATALOG_PAGE)),
+        _case("catalog.color", build_catalog_query(ProductFilters(color="Коричневый"), "price", None, CATALOG_PAGE)),
+        _case("catalog.price_range",
+              build_catalog_query(ProductFilters(min_price=10000, max_price=30000), "price", None, CATALOG_PAGE)),
+        _case("catalog.in_stock_sizes",
+              build_catalog_query(ProductFilters(in_stock=True, min_width=1.0, max_height=2.0), "name", None,
+                                  CATALOG_PAGE)),
+        _case("catalog.text_relevance",
+              build_catalog_query(ProductFilters(name="окно"), "relevance", None, CATALOG_PAGE)),
+        _case("catalog.text_short_with_filters",
+              build_catalog_query(ProductFilters(name="ок", material="ПВХ", max_price=80000), "price", None,
+                                  CATALOG_PAGE)),
+        # Фасеты считаются по всем товарам под фильтрами; без фильтров — по всей коллекции
+        _case("catalog.facets", build_facet_query(ProductFilters()), ("products",)),
+        _case("catalog.facets_material", build_facet_query(ProductFilters(material="ПВХ"))),
+        _case("catalog.facets_text", build_facet_query(ProductFilters(name="окно"))),
+    ]
+
+
+def order_cases() -> List[QueryCase]:
+    return [
+        _case("my_orders", build_my_orders_query(SAMPLE_CUSTOMER, None, None, ORDERS_PAGE)),
+        _case("my_orders.status_next_page",
+              build_my_orders_query(SAMPLE_CUSTOMER, "completed", ["2025-02-01T00:00:00", "o500"], ORDERS_PAGE)),
+        _case("admin_orders.default", build_admin_orders_query(OrderFilters(), "-created_at", None, ORDERS_PAGE)),
+        _case("admin_orders.status_dates",
+              build_admin_orders_query(OrderFilters(status="new", date_from=date(2025, 1, 1), date_to=date(2025, 3, 31)),
+                                       "-created_at", None, ORDERS_PAGE)),
+        _case("admin_orders.customer",
+              build_admin_orders_query(OrderFilters(customer_id=SAMPLE_CUSTOMER), "created_at", None, ORDERS_PAGE)),
+        _case("admin_orders.product",
+              build_admin_orders_query(OrderFilters(product_id=SAMPLE_PRODUCT), "-created_at", None, ORDERS_PAGE)),
+        _case("admin_orders.by_total", build_admin_orders_query(OrderFilters(), "-total_price", None, ORDERS_PAGE)),
+        _case("rollup_delta", rollup_delta_query({"product_id": SAMPLE_PRODUCT, "quantity": 2,
+                                                  "total_price": 40000, "created_at": SAMPLE_DAY}, 1)),
+        _case("order_create", create_order_query({"customer_id": SAMPLE_CUSTOMER, "product_id": SAMPLE_PRODUCT,
+                                                  "quantity": 2, "status": "new", "created_at": SAMPLE_DAY})),
+    ]
+
+
+def user_cases() -> List[QueryCase]:
+    return [
+        _case("admin_users.default", build_admin_users_query(None, None, None, USERS_PAGE)),
+        # Поиск — объединение диапазонов нескольких индексов (OR по полям), порядок списка
+        # после него восстанавливается сортировкой найденных по префиксу строк
+        _case("admin_users.search", build_admin_users_query("Ив", None, None, USERS_PAGE), memory_sorts=("users",)),
+        _case("admin_users.search_phone", build_admin_users_query("+7900", None, None, USERS_PAGE),
+              memory_sorts=("users",)),
+        _case("admin_users.role", build_admin_users_query(None, "measurer", None, USERS_PAGE)),
+        # Запросы из main.py: вход, проверка эпохи токена и её увеличение
+        QueryCase("users.by_username", "FOR u IN users FILTER u.username == @username LIMIT 1 RETURN u",
+                  {"username": "user42"}),
+        QueryCase("users.token_epoch", "LET u = DOCUMENT('users', @key) RETURN u ? (u.token_epoch || 0) : null",
+                  {"key": SAMPLE_CUSTOMER}),
+        QueryCase("users.bump_token_epoch",
+                  "FOR u IN users FILTER u._key == @key "
+                  "UPDATE u WITH {token_epoch: (u.token_epoch || 0) + 1} IN users RETURN NEW.token_epoch",
+                  {"key": SAMPLE_CUSTOMER}),
+    ]
+
+
+def admin_cases() -> List[QueryCase]:
+    cases = [
+        _case("admin_products.search", admin_search_query("окно")),
+        # Список товаров в админке без поиска и форма заказа выводят весь ассортимент
+        QueryCase("admin_products.all", "FOR p IN products RETURN p", {}, ("products",)),
+        QueryCase("products.in_stock", "FOR p IN products FILTER p.in_stock == true RETURN p", {}, ("products",)),
+        # Сводка считает заказы по статусам и незавершённые замеры по всей коллекции
+        QueryCase("stats", STATS_QUERY, {"today": SAMPLE_DAY}, ("orders", "measurements")),
+        # Агрегаты — сотни строк, отчёты читают их целиком
+        QueryCase("analytics.daily", DAILY_REPORT_AQL, {"since": SAMPLE_DAY}, ("sales_daily",)),
+        QueryCase("analytics.monthly", MONTHLY_REPORT_AQL, {"limit": 12}, ("sales_daily",)),
+        QueryCase("analytics.top_products", TOP_PRODUCTS_AQL, {"limit": 10}, ("sales_by_product",),
+                  ("sales_by_product",)),
+        QueryCase("analytics.materials", MATERIAL_REPORT_AQL, {}, ("sales_by_product",)),
+    ]
+    for entity_type in ENTITY_TYPES:
+        cases.append(_case(f"entities.{entity_type}", build_entity_page_query(entity_type, "k500", ENTITY_PAGE_SIZE)))
+    return cases
+
+
+def query_cases() -> List[QueryCase]:
+    """Все формы запросов приложения; имена уникальны и служат ключами базовой стоимости"""
+    return catalog_cases() + order_cases() + user_cases() + admin_cases()
@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from arango.database import StandardDatabase
+
+from .db import get_db
+from .slowlog import slow_queries
+
+
+# Размер пула потоков, в котором выполняются вызовы синхронного клиента python-arango
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="arango")
+
+
+async def run_sync(func: Callable, *args, **kwargs) -> Any:
+    """Выполняет блокирующий вызов в пуле БД, не останавливая event loop"""
+    loop = asyncio.get_running_loop()
+    # Копируем контекст, чтобы contextvars запроса были видны внутри потока
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncCollection:
+    """Асинхронная обёртка над коллекцией: курсоры материализуются внутри пула"""
+
+    def __init__(self, database: "AsyncDatabase", name: str):
+        self._database = database
+        self.name = name
+
+    def _collection(self):
+        return self._database.sync().collection(self.name)
+
+    async def find(self, filters: Dict[str, Any], skip: Optional[int] = None,
+                   limit: Optional[int] = None) -> List[dict]:
+        return await run_sync(lambda: list(self._collection().find(filters, skip=skip, limit=limit)))
+
+    async def find_one(self, filters: Dict[str, Any]) -> Optional[dict]:
+        documents = await self.find(filters, limit=1)
+        return documents[0] if documents else None
+
+    async def get(self, key: str) -> Optional[dict]:
+        return await run_sync(lambda: self._collection().get(key))
+
+    async def all(self) -> List[dict]:
+        return await run_sync(lambda: list(self._collection().all()))
+
+    async def insert(self, document: dict, **kwargs) -> dict:
+        return await run_sync(lambda: self._collection().insert(document, **kwargs))
+
+    async def update(self, document: dict, **kwargs) -> dict:
+        """Обновляет документ по _key из самого документа — без сканирования по фильтру"""
+        return await run_sync(lambda: self._collection().update(document, **kwargs))
+
+    async def update_match(self, filters: Dict[str, Any], body: dict, **kwargs) -> int:
+        return await run_sync(lambda: self._collection().update_match(filters, body, **kwargs))
+
+    async def count(self) -> int:
+        return await run_sync(lambda: self._collection().count())
+
+
+class AsyncAQL:
+    def __init__(self, database: "AsyncDatabase"):
+        self._database = database
+
+    async def execute(self, query: str, bind_vars: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        """Выполняет AQL-запрос и возвращает все результаты списком"""
+        rows, _ = await self.execute_with_stats(query, bind_vars, **kwargs)
+        return rows
+
+    async def execute_with_stats(self, query: str, bind_vars: Optional[Dict[str, Any]] = None,
+                                 **kwargs) -> Tuple[List[Any], Dict[str, Any]]:
+        """Как execute, но дополнительно возвращает статистику курсора (fullCount и т.п.)"""
+        def run():
+            db = self._database.sync()
+            started = time.perf_counter()
+            cursor = db.aql.execute(query, bind_vars=bind_vars or {}, **kwargs)
+            rows = list(cursor)
+            stats = cursor.statistics() or {}
+            slow_queries.observe(db, query, bind_vars, time.perf_counter() - started, stats)
+            return rows, stats
+        return await run_sync(run)
+
+    async def stream(self, query: str, bind_vars: Optional[Dict[str, Any]] = None,
+                     batch_size: int = 1000, **kwargs) -> AsyncIterator[List[Any]]:
+        """Отдаёт результаты потокового курсора пачками, не держа в памяти весь результат"""
+        db = await run_sync(self._database.sync)
+        # Для журнала медленных запросов учитываем только время обращений к БД,
+        # а не паузы, пока клиент читает выгрузку
+        db_time = 0.0
+
+        def timed(func):
+            nonlocal db_time
+            started = time.perf_counter()
+            try:
+                return func()
+            finally:
+                db_time += time.perf_counter() - started
+
+        cursor = await run_sync(timed, lambda: db.aql.execute(
+            query, bind_vars=bind_vars or {}, batch_size=batch_size, stream=True, **kwargs
+        ))
+        try:
+            while True:
+                batch = await run_sync(timed, lambda: list(itertools.islice(cursor, batch_size)))
+                if not batch:
+                    break
+                yield batch
+        finally:
+            # Если клиент прервал загрузку, освобождаем курсор на сервере
+            await run_sync(lambda: cursor.close(ignore_missing=True))
+            await run_sync(slow_queries.observe, db, query, bind_vars, db_time, cursor.statistics())
+
+
+class AsyncDatabase:
+    """Асинхронный слой доступа к данным поверх синхронного python-arango"""
+
+    def __init__(self, resolver: Callable[[], StandardDatabase]):
+        self._resolver = resolver
+        self.aql = AsyncAQL(self)
+
+    def sync(self) -> StandardDatabase:
+        return self._resolver()
+
+    def collection(self, name: str) -> AsyncCollection:
+        return AsyncCollection(self, name)
+
+    async def has_collection(self, name: str) -> bool:
+        return await run_sync(lambda: self.sync().has_collection(name))
+
+    async def create_collection(self, name: str, **kwargs):
+        return await run_sync(lambda: self.sync().create_collection(name, **kwargs))
+
+
+repo = AsyncDatabase(get_db)
@@ -0,0 +1,162 @@
+"""Журнал медленных AQL-запросов и сводка по «формам» запросов.
+
+Каждое выполнение через repository.AsyncAQL попадает в таблицу форм запросов
+(текст без лишних пробелов; значения передаются bind-параметрами, поэтому текст
+и есть форма). Запросы дольше SLOW_QUERY_MS дополнительно пишутся в лог вместе
+с bind vars без чувствительных значений, статистикой курсора и планом оптимизатора.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from arango.database import StandardDatabase
+
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_TOP_N = int(os.getenv("SLOW_QUERY_TOP_N", "20"))
+# EXPLAIN для одной и той же формы запроса — не чаще раза в столько секунд
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+# Сколько форм запросов хранить в таблице
+MAX_QUERY_SHAPES = 500
+
+SENSITIVE_BIND_VARS = re.compile(r"pass|hash|token|secret", re.IGNORECASE)
+MAX_BIND_VALUE_LENGTH = 64
+MAX_BIND_LIST_ITEMS = 5
+
+# Показатели статистики курсора, которые попадают в лог и таблицу
+STAT_FIELDS = ("scanned_full", "scanned_index", "filtered", "peak_memory_usage", "execution_time")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+def query_digest(shape: str) -> str:
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]
+
+
+def sanitize_bind_vars(bind_vars: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Bind vars для лога: без паролей и хэшей, длинные значения укорочены"""
+    def shorten(value: Any) -> Any:
+        if isinstance(value, str) and len(value) > MAX_BIND_VALUE_LENGTH:
+            return value[:MAX_BIND_VALUE_LENGTH] + "…"
+        if isinstance(value, list):
+            head = [shorten(item) for item in value[:MAX_BIND_LIST_ITEMS]]
+            return head + ([f"… ещё {len(value) - MAX_BIND_LIST_ITEMS}"] if len(value) > MAX_BIND_LIST_ITEMS else [])
+        if isinstance(value, dict):
+            return {key: "***" if SENSITIVE_BIND_VARS.search(key) else shorten(item) for key, item in value.items()}
+        return value
+    return {name: "***" if SENSITIVE_BIND_VARS.search(name) else shorten(value)
+            for name, value in (bind_vars or {}).items()}
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Из плана EXPLAIN — оценка стоимости и цепочка узлов с коллекциями и индексами"""
+    nodes = []
+    for node in plan.get("nodes", []):
+        description = node.get("type", "?")
+        if node.get("collection"):
+            description += f"({node['collection']})"
+        indexes = [index.get("name") or index.get("type") for index in node.get("indexes", [])]
+        if indexes:
+            description += "[" + ",".join(str(name) for name in indexes) + "]"
+        if node.get("view"):
+            description += f"({node['view']})"
+        nodes.append(description)
+    return {"estimated_cost": plan.get("estimatedCost"), "nodes": nodes, "rules": plan.get("rules", [])}
+
+
+class QueryShape:
+    def __init__(self, shape: str):
+        self.digest = query_digest(shape)
+        self.query = shape
+        self.count = 0
+        self.slow_count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_stats: Dict[str, Any] = {}
+        self.plan: Optional[Dict[str, Any]] = None
+        self.explained_at = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "digest": self.digest,
+            "query": self.query,
+            "count": self.count,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0,
+            "max_ms": round(self.max_ms, 1),
+            "last_stats": self.last_stats,
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self._shapes: Dict[str, QueryShape] = {}
+        self._lock = threading.Lock()
+        # EXPLAIN — ещё одно обращение к БД; выполняется в своём потоке,
+        # чтобы и без того медленный запрос не ждал его
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slowlog-explain")
+
+    def observe(self, db: StandardDatabase, query: str, bind_vars: Optional[Dict[str, Any]],
+                elapsed: float, statistics: Optional[Dict[str, Any]] = None):
+        """Учитывает выполнение запроса; вызывается в потоке пула БД сразу после него"""
+        elapsed_ms = elapsed * 1000
+        shape_text = normalize_query(query)
+        slow = elapsed_ms >= self.threshold_ms
+        stats = {field: statistics[field] for field in STAT_FIELDS if statistics and field in statistics}
+
+        with self._lock:
+            shape = self._shapes.get(shape_text)
+            if shape is None:
+                if len(self._shapes) >= MAX_QUERY_SHAPES:
+                    # Вытесняем самую «дешёвую» форму, чтобы таблица не росла без границ
+                    cheapest = min(self._shapes, key=lambda key: self._shapes[key].total_ms)
+                    del self._shapes[cheapest]
+                shape = self._shapes[shape_text] = QueryShape(shape_text)
+            shape.count += 1
+            shape.total_ms += elapsed_ms
+            shape.max_ms = max(shape.max_ms, elapsed_ms)
+            if stats:
+                shape.last_stats = stats
+            if not slow:
+                return
+            shape.slow_count += 1
+            need_plan = time.monotonic() - shape.explained_at >= SLOW_QUERY_EXPLAIN_INTERVAL
+            if need_plan:
+                shape.explained_at = time.monotonic()
+
+        print(f"[SLOW AQL] {elapsed_ms:.0f} мс [{shape.digest}] {shape_text}\n"
+              f"    bind_vars={sanitize_bind_vars(bind_vars)}\n"
+              f"    stats={stats}")
+        if need_plan:
+            self._explainer.submit(self._explain, db, shape, query, dict(bind_vars or {}))
+
+    def _explain(self, db: StandardDatabase, shape: QueryShape, query: str, bind_vars: Dict[str, Any]):
+        try:
+            plan = summarize_plan(db.aql.explain(query, bind_vars=bind_vars))
+        except Exception as e:
+            plan = {"error": str(e)}
+        with self._lock:
+            shape.plan = plan
+        print(f"[SLOW AQL] план [{shape.digest}] {plan}")
+
+    def top(self, n: int = SLOW_QUERY_TOP_N) -> List[dict]:
+        """Самые затратные формы запросов по суммарному времени"""
+        with self._lock:
+            shapes = sorted(self._shapes.values(), key=lambda shape: shape.total_ms, reverse=True)[:n]
+            return [shape.as_dict() for shape in shapes]
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .db import is_connected
+from .repository import AsyncDatabase
+
+
+# Сводка для админ-панели и /api/health: обновляется в фоне раз в STATS_REFRESH_SECONDS
+# (или раньше, если были записи), а читатели получают данные не старше STATS_MAX_AGE_SECONDS
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "30"))
+STATS_MAX_AGE_SECONDS = float(os.getenv("STATS_MAX_AGE_SECONDS", "120"))
+# Не чаще, чем раз в столько секунд, пересчитываем сводку после записей
+STATS_DIRTY_DELAY_SECONDS = float(os.getenv("STATS_DIRTY_DELAY_SECONDS", "2"))
+
+# Все показатели одним запросом: LENGTH(collection) берёт счётчик коллекции без чтения документов.
+# Замер считается незавершённым, пока в нём не заполнены размеры проёма.
+STATS_QUERY = """
+LET orders_by_status = (
+    FOR o IN orders
+        COLLECT status = o.status WITH COUNT INTO n
+        RETURN [status, n]
+)
+LET today = FIRST(
+    FOR o IN orders
+        FILTER o.created_at >= @today AND o.status != "cancelled"
+        COLLECT AGGREGATE revenue = SUM(o.total_price), n = COUNT(1)
+        RETURN {revenue, n}
+)
+RETURN {
+    users_count: LENGTH(users),
+    products_count: LENGTH(products),
+    orders_count: LENGTH(orders),
+    measurements_count: LENGTH(measurements),
+    orders_by_status: ZIP(orders_by_status[*][0], orders_by_status[*][1]),
+    today_orders: today.n || 0,
+    today_revenue: today.revenue || 0,
+    pending_measurements: LENGTH(
+        FOR m IN measurements FILTER m.width == null OR m.height == null RETURN 1
+    )
+}
+"""
+
+
+class StatsCache:
+    """Материализованная сводка по данным магазина"""
+
+    def __init__(self, repo: AsyncDatabase):
+        self._repo = repo
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.refreshed_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._dirty = False
+        self._lock = asyncio.Lock()
+
+    def age(self) -> Optional[float]:
+        return time.monotonic() - self.refreshed_at if self.refreshed_at is not None else None
+
+    def mark_dirty(self):
+        """Данные изменились — фоновая задача пересчитает сводку без ожидания расписания"""
+        self._dirty = True
+
+    async def refresh(self) -> Dict[str, Any]:
+        async with self._lock:
+            self._dirty = False
+            today = datetime.utcnow().date().isoformat()
+            try:
+                rows = await self._repo.aql.execute(STATS_QUERY, bind_vars={"today": today})
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.snapshot = rows[0]
+            self.refreshed_at = time.monotonic()
+            self.error = None
+            return self.snapshot
+
+    async def get(self) -> Dict[str, Any]:
+        """Сводка из памяти; пересчитывается на месте, только если старше STATS_MAX_AGE_SECONDS"""
+        age = self.age()
+        if self.snapshot is None or age > STATS_MAX_AGE_SECONDS:
+            return await self.refresh()
+        return self.snapshot
+
+    def peek(self) -> dict:
+        """Текущее состояние без обращения к БД — для проверок балансировщика"""
+        age = self.age()
+        return {
+            **(self.snapshot or {}),
+            "stats_age_seconds": round(age, 1) if age is not None else None,
+            "stats_stale": age is None or age > STATS_MAX_AGE_SECONDS,
+            "stats_error": self.error,
+        }
+
+    async def run(self):
+        """Фоновое обновление: по расписанию или вскоре после записей"""
+        while True:
+            await asyncio.sleep(STATS_DIRTY_DELAY_SECONDS)
+            if not is_connected():
+                continue
+            age = self.age()
+            if self._dirty or age is None or age >= STATS_REFRESH_SECONDS:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"[WARN] Не удалось обновить статистику: {e}")
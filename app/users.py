@@ -0,0 +1,77 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from .pagination import SortKey, keyset_filter, sort_clause
+
+
+USER_ROLES = ["customer", "measurer", "admin", "superadmin"]
+
+# Список пользователей в админке идёт в порядке индекса [last_name, first_name, _key]
+ADMIN_USERS_SORT: List[SortKey] = [("last_name", "ASC"), ("first_name", "ASC"), ("_key", "ASC")]
+
+# Колонки admin/users.html; password_hash и прочие поля профиля в список не попадают
+ADMIN_USER_FIELDS = ["_key", "username", "first_name", "last_name", "role", "phone_number", "created_at"]
+
+
+def prefix_bounds(prefix: str) -> Tuple[str, str]:
+    """Полуинтервал [prefix, next) для поиска по префиксу через persistent-индекс.
+
+    Строки в ArangoDB сравниваются по ICU-сортировке, где регистр различается лишь
+    на последнем уровне, поэтому интервал от строчного префикса захватывает и
+    «Иванов», и «иванов»; точное совпадение проверяет STARTS_WITH ниже.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_condition(field: str, bind_name: str, bind_vars: Dict[str, Any], prefix: str) -> str:
+    bind_vars[f"{bind_name}_from"], bind_vars[f"{bind_name}_to"] = prefix_bounds(prefix)
+    bind_vars[bind_name] = prefix
+    return (f"(u.{field} >= @{bind_name}_from AND u.{field} < @{bind_name}_to"
+            f" AND STARTS_WITH(LOWER(u.{field}), @{bind_name}))")
+
+
+def search_conditions(search: str, bind_vars: Dict[str, Any]) -> List[str]:
+    """Ветки OR для поиска: каждая — диапазон своего индекса"""
+    term = search.strip().lower()
+    branches = [
+        _prefix_condition("last_name", "last_name_prefix", bind_vars, term),
+        _prefix_condition("first_name", "first_name_prefix", bind_vars, term),
+        _prefix_condition("username", "username_prefix", bind_vars, term),
+    ]
+    phone = term.replace(" ", "").replace("-", "")
+    if phone.lstrip("+").isdigit():
+        if not phone.startswith("+"):
+            phone = "+" + phone
+        bind_vars["phone_from"], bind_vars["phone_to"] = prefix_bounds(phone)
+        branches.append("(u.phone_number >= @phone_from AND u.phone_number < @phone_to)")
+
+    words = term.split()
+    if len(words) == 2:
+        # «Фамилия Имя» — оба префикса ложатся на один индекс [last_name, first_name]
+        branches.append(
+            "(" + _prefix_condition("last_name", "full_last_name", bind_vars, words[0]) + " AND "
+            + _prefix_condition("first_name", "full_first_name", bind_vars, words[1]) + ")"
+        )
+    return branches
+
+
+def build_admin_users_query(search: Optional[str], role: Optional[str], after: Optional[List[Any]],
+                            page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """AQL одной страницы пользователей: поиск по префиксу, фильтр по роли и проекция"""
+    conditions = []
+    bind_vars: Dict[str, Any] = {"page_limit": page_size + 1}
+    if role:
+        conditions.append("u.role == @role")
+        bind_vars["role"] = role
+    if search and search.strip():
+        conditions.append("(" + " OR ".join(search_conditions(search, bind_vars)) + ")")
+    if after is not None:
+        condition, cursor_vars = keyset_filter("u", ADMIN_USERS_SORT, after)
+        conditions.append(condition)
+        bind_vars.update(cursor_vars)
+
+    query = "FOR u IN users"
+    if conditions:
+        query += " FILTER " + " AND ".join(conditions)
+    fields = ", ".join(f"{field}: u.{field}" for field in ADMIN_USER_FIELDS)
+    query += f" {sort_clause('u', ADMIN_USERS_SORT)} LIMIT @page_limit RETURN {{{fields}}}"
+    return query, bind_vars
@@ -0,0 +1,122 @@
+"""Нагрузочный тест входа: пропускная способность /login и p99 каталога во время волны логинов.
+
+Запуск (приложение должно быть поднято):
+    python scripts/bench_login.py --base-url http://127.0.0.1:8000 --duration 20
+
+Сценарий состоит из двух фаз одинаковой длительности:
+  1. только запросы к /products — базовая задержка каталога;
+  2. те же запросы к /products параллельно с потоком POST /login.
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def open_connection(base_url):
+    parsed = urlparse(base_url)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+
+
+def login(conn, username, password):
+    body = urlencode({"username": username, "password": password})
+    conn.request("POST", "/login", body=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader("Set-Cookie") or ""
+    return response.status, cookie.split(";", 1)[0]
+
+
+def catalog_worker(base_url, cookie, stop, latencies, errors):
+    conn = open_connection(base_url)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            conn.request("GET", "/products", headers={"Cookie": cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn = open_connection(base_url)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def login_worker(base_url, username, password, stop, results):
+    conn = open_connection(base_url)
+    while not stop.is_set():
+        try:
+            status, _ = login(conn, username, password)
+            results.append(status)
+        except (OSError, http.client.HTTPException) as e:
+            results.append(str(e))
+            conn = open_connection(base_url)
+
+
+def run_phase(args, cookie, with_logins):
+    stop = threading.Event()
+    latencies, errors, login_results = [], [], []
+    threads = [
+        threading.Thread(target=catalog_worker, args=(args.base_url, cookie, stop, latencies, errors))
+        for _ in range(args.catalog_concurrency)
+    ]
+    if with_logins:
+        threads += [
+            threading.Thread(target=login_worker, args=(args.base_url, args.username, args.password, stop, login_results))
+            for _ in range(args.login_concurrency)
+        ]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ok_logins = sum(1 for r in login_results if r == 303)
+    rejected = sum(1 for r in login_results if r == 503)
+    return {
+        "catalog_requests": len(latencies),
+        "catalog_errors": len(errors),
+        "catalog_p50_ms": percentile(latencies, 50) * 1000,
+        "catalog_p99_ms": percentile(latencies, 99) * 1000,
+        "logins_ok_per_sec": ok_logins / args.duration,
+        "logins_rejected": rejected,
+        "logins_failed": len(login_results) - ok_logins - rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="customer1")
+    parser.add_argument("--password", default="customer123")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--catalog-concurrency", type=int, default=4)
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    status, cookie = login(open_connection(args.base_url), args.username, args.password)
+    if status != 303 or not cookie:
+        raise SystemExit(f"Не удалось войти как {args.username}: HTTP {status}")
+
+    for title, with_logins in (("Только каталог", False), ("Каталог + логины", True)):
+        result = run_phase(args, cookie, with_logins)
+        print(f"== {title} ({args.duration:.0f} с)")
+        for key, value in result.items():
+            print(f"   {key:20} {value:.2f}" if isinstance(value, float) else f"   {key:20} {value}")
+
+
+if __name__ == "__main__":
+    main()
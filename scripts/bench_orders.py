@@ -0,0 +1,160 @@
+"""Бенчмарк создания заказа: прежние последовательные обращения к БД против одного AQL-запроса.
+
+Прежний путь (до create_order_query) — четыре обращения подряд: products.get, orders.insert,
+приращение агрегатов и вставка ребра user_orders. Новый — один запрос CREATE_ORDER_AQL,
+который дополнительно пишет ребро contain_product.
+
+Запуск (нужна доступная ArangoDB, параметры подключения — как у приложения, ARANGO_*):
+    python scripts/bench_orders.py --orders 5000 --concurrency 8
+
+Данные создаются в отдельной временной базе (по умолчанию windowshop_bench_orders),
+которая удаляется после прогона, если не указан --keep.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.analytics import rollup_delta_query  # noqa: E402
+from app.db import DB_PASS, DB_USER, create_client  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+from app.orders import create_order_query  # noqa: E402
+
+MATERIALS = ["ПВХ", "Дерево", "Алюминий", "Стеклопакет"]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def new_order(user_key, product_key):
+    now = datetime.utcnow().isoformat()
+    return {
+        "customer_id": user_key,
+        "customer_name": f"Покупатель {user_key}",
+        "product_id": product_key,
+        "quantity": random.randint(1, 5),
+        "address": "г. Санкт-Петербург",
+        "comments": None,
+        "status": "new",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def create_sequential(db, order_data):
+    """Прежняя реализация /order/create"""
+    product = db.collection("products").get(order_data["product_id"])
+    order_data = dict(order_data, product_name=product["name"],
+                      total_price=product["price"] * order_data["quantity"])
+    order = db.collection("orders").insert(order_data)
+    query, bind_vars = rollup_delta_query(order_data, 1)
+    db.aql.execute(query, bind_vars=bind_vars)
+    db.collection("user_orders").insert({
+        "_from": f"users/{order_data['customer_id']}",
+        "_to": f"orders/{order['_key']}",
+        "type": "created",
+        "created_at": datetime.utcnow().isoformat()
+    })
+
+
+def create_single(db, order_data):
+    query, bind_vars = create_order_query(order_data)
+    if not list(db.aql.execute(query, bind_vars=bind_vars)):
+        raise RuntimeError(f"Товар {order_data['product_id']} не найден")
+
+
+def run(label, create, db, args):
+    """Создаёт args.orders заказов в args.concurrency потоков; печатает заказов/с и перцентили"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(args.orders))
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            order_data = new_order(f"u{random.randrange(args.users)}", f"p{random.randrange(args.products)}")
+            started = time.perf_counter()
+            try:
+                create(db, order_data)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed * 1000)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"  {label:<28} {len(latencies) / elapsed:10.1f} заказов/с"
+          f"  p50 {percentile(latencies, 50):7.2f} мс  p99 {percentile(latencies, 99):7.2f} мс"
+          f"  ошибок {len(errors)}")
+    if errors:
+        print(f"    первая ошибка: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк создания заказа")
+    parser.add_argument("--orders", type=int, default=5000, help="заказов на каждый вариант")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--database", default="windowshop_bench_orders")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после прогона")
+    args = parser.parse_args()
+
+    random.seed(42)
+    client = create_client()
+    sys_db = client.db("_system", username=DB_USER, password=DB_PASS)
+    if sys_db.has_database(args.database):
+        sys_db.delete_database(args.database)
+    sys_db.create_database(args.database)
+    db = client.db(args.database, username=DB_USER, password=DB_PASS)
+
+    try:
+        migrate(db)
+        db.collection("products").import_bulk([
+            {"_key": f"p{i}", "name": f"Окно {i}", "material": random.choice(MATERIALS),
+             "price": random.randint(5, 200) * 1000, "in_stock": True}
+            for i in range(args.products)
+        ])
+        db.collection("users").import_bulk([
+            {"_key": f"u{i}", "username": f"user{i}", "role": "customer", "phone_number": f"+79{i:09d}"}
+            for i in range(args.users)
+        ])
+
+        print(f"Создание заказов: по {args.orders} на вариант, {args.concurrency} потоков")
+        run("последовательно (4 запроса)", create_sequential, db, args)
+        run("одним AQL-запросом", create_single, db, args)
+
+        # Агрегаты должны сойтись с заказами при любом способе создания
+        totals = db.aql.execute(
+            "RETURN {orders: SUM(FOR o IN orders RETURN o.total_price),"
+            " rollups: SUM(FOR d IN sales_daily RETURN d.revenue)}"
+        ).next()
+        print(f"  выручка по заказам {totals['orders']}, по агрегатам {totals['rollups']}")
+    finally:
+        if not args.keep:
+            sys_db.delete_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
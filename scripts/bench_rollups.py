@@ -0,0 +1,142 @@
+"""Бенчмарк агрегатов продаж: полный пересчёт, приращения и отчёты по сырым заказам и по агрегатам.
+
+Запуск (нужна доступная ArangoDB, параметры подключения — как у приложения, ARANGO_*):
+    python scripts/bench_rollups.py --orders 500000 --products 2000
+
+Данные создаются в отдельной временной базе (по умолчанию windowshop_bench_rollups),
+которая удаляется после прогона, если не указан --keep.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.analytics import (MONTHLY_REPORT_AQL, TOP_PRODUCTS_AQL, ensure_collections,  # noqa: E402
+                           rebuild_rollups, rollup_delta_query)
+from app.db import DB_PASS, DB_USER, create_client  # noqa: E402
+
+MATERIALS = ["ПВХ", "Дерево", "Алюминий", "Стеклопакет"]
+STATUSES = ["new", "processing", "paid_online", "completed", "completed", "completed", "cancelled"]
+
+# Тот же отчёт по месяцам, но напрямую по заказам — так его пришлось бы строить без агрегатов
+RAW_MONTHLY_AQL = """
+FOR o IN orders
+    FILTER o.status NOT IN ["cancelled"]
+    COLLECT month = SUBSTRING(o.created_at, 0, 7)
+    AGGREGATE orders = COUNT(1), quantity = SUM(o.quantity), revenue = SUM(o.total_price)
+    SORT month DESC
+    LIMIT @limit
+    RETURN {month, orders, quantity, revenue}
+"""
+
+
+def generate_products(count):
+    for i in range(count):
+        yield {
+            "_key": f"p{i}",
+            "name": f"Окно {i}",
+            "material": random.choice(MATERIALS),
+            "price": random.randint(5, 200) * 1000,
+        }
+
+
+def generate_orders(count, products, days):
+    start = datetime.utcnow() - timedelta(days=days)
+    for i in range(count):
+        product = random.randrange(products)
+        quantity = random.randint(1, 5)
+        created_at = start + timedelta(seconds=random.randrange(days * 86400))
+        yield {
+            "_key": f"o{i}",
+            "customer_id": f"c{random.randrange(count // 10 + 1)}",
+            "product_id": f"p{product}",
+            "quantity": quantity,
+            "total_price": quantity * random.randint(5, 200) * 1000,
+            "status": random.choice(STATUSES),
+            "created_at": created_at.isoformat(),
+        }
+
+
+def import_in_batches(collection, documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            collection.import_bulk(batch, on_duplicate="replace")
+            batch = []
+    if batch:
+        collection.import_bulk(batch, on_duplicate="replace")
+
+
+def timed(label, func, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+    print(f"  {label:<40} {elapsed:10.1f} мс")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк агрегатов продаж")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--deltas", type=int, default=500, help="сколько приращений замерить")
+    parser.add_argument("--database", default="windowshop_bench_rollups")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после прогона")
+    args = parser.parse_args()
+
+    random.seed(42)
+    client = create_client()
+    sys_db = client.db("_system", username=DB_USER, password=DB_PASS)
+    if sys_db.has_database(args.database):
+        sys_db.delete_database(args.database)
+    sys_db.create_database(args.database)
+    db = client.db(args.database, username=DB_USER, password=DB_PASS)
+
+    try:
+        for name in ("products", "orders"):
+            db.create_collection(name)
+        ensure_collections(db)
+
+        print(f"Генерация: {args.products} товаров, {args.orders} заказов за {args.days} дней")
+        started = time.perf_counter()
+        import_in_batches(db.collection("products"), generate_products(args.products), args.batch_size)
+        import_in_batches(db.collection("orders"), generate_orders(args.orders, args.products, args.days),
+                          args.batch_size)
+        print(f"  загружено за {time.perf_counter() - started:.1f} с")
+
+        print("Результаты:")
+        result = timed("полный пересчёт (rebuild_rollups)", lambda: rebuild_rollups(db))
+        print(f"  агрегатов: дней {result['days']}, товаров {result['products']}")
+
+        orders = list(generate_orders(args.deltas, args.products, args.days))
+
+        def apply_deltas():
+            for order in orders:
+                query, bind_vars = rollup_delta_query(order, 1)
+                db.aql.execute(query, bind_vars=bind_vars)
+
+        started = time.perf_counter()
+        apply_deltas()
+        per_delta = (time.perf_counter() - started) / len(orders) * 1000
+        print(f"  {'приращение на один заказ':<40} {per_delta:10.2f} мс")
+
+        timed("отчёт по месяцам из orders", lambda: list(db.aql.execute(RAW_MONTHLY_AQL, bind_vars={"limit": 12})), 3)
+        timed("отчёт по месяцам из sales_daily",
+              lambda: list(db.aql.execute(MONTHLY_REPORT_AQL, bind_vars={"limit": 12})), 3)
+        timed("топ товаров из sales_by_product",
+              lambda: list(db.aql.execute(TOP_PRODUCTS_AQL, bind_vars={"limit": 20})), 3)
+    finally:
+        if not args.keep:
+            sys_db.delete_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Проверка планов AQL-запросов приложения (app/query_registry.py).
+
+Для каждой формы запроса выполняется EXPLAIN на базе с синтетическими данными.
+Проверка не проходит, если:
+  * в плане есть EnumerateCollectionNode (полный просмотр) по коллекции больше
+    --max-scan-size документов, а запрос не помечен как читающий её целиком;
+  * SORT выполняется в памяти перед LIMIT (SortNode) по такой же большой коллекции —
+    индекс не покрывает сортировку, и каждая страница читает все подходящие документы;
+  * оценка стоимости выросла больше чем на --tolerance относительно базовой
+    из scripts/query_plan_baseline.json или для запроса базовой ещё нет.
+Без файла базовой стоимости сравнение стоимости пропускается с предупреждением,
+правила плана проверяются как обычно. Та же проверка запускается из тестов
+(tests/test_query_plans.py), если ArangoDB доступна.
+
+Запуск (нужна доступная ArangoDB, параметры подключения — как у приложения, ARANGO_*):
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --update-baseline   # записать текущие оценки как базовые
+
+Данные создаются в отдельной временной базе (по умолчанию windowshop_query_plans),
+которая удаляется после прогона, если не указан --keep. Код возврата 1 — есть нарушения.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.analytics import rebuild_rollups  # noqa: E402
+from app.catalog import normalize_product  # noqa: E402
+from app.db import ARANGO_HOSTS, DB_PASS, DB_USER, create_client  # noqa: E402
+from app.migrations import migrate  # noqa: E402
+from app.query_registry import query_cases  # noqa: E402
+from app.slowlog import summarize_plan  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baseline.json")
+
+MATERIALS = ["ПВХ", "Дерево", "Алюминий", "Стеклопакет"]
+COLORS = ["Белый", "Коричневый", "Серый", "Антрацит", "Золотой дуб"]
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Сергей", "Ольга", "Игорь", "Елена"]
+LAST_NAMES = ["Иванов", "Петров", "Смирнова", "Кузнецова", "Соколов", "Попова", "Волков", "Новикова"]
+ROLES = ["customer"] * 18 + ["measurer", "admin"]
+STATUSES = ["new", "processing", "paid_online", "completed", "completed", "completed", "cancelled"]
+
+
+def random_moment(start, days):
+    return (start + timedelta(seconds=random.randrange(days * 86400))).isoformat()
+
+
+def generate_products(count, start, days):
+    for i in range(count):
+        yield normalize_product({
+            "_key": f"p{i}",
+            "name": f"Окно {i}",
+            "material": random.choice(MATERIALS),
+            "color": random.choice(COLORS),
+            "width": round(random.uniform(0.4, 3.0), 2),
+            "height": round(random.uniform(0.4, 2.5), 2),
+            "price": random.randint(5, 200) * 1000,
+            "in_stock": random.random() < 0.8,
+            "description": f"Оконная конструкция {i}",
+            "created_at": random_moment(start, days),
+        })
+
+
+def generate_users(count, start, days):
+    for i in range(count):
+        yield {
+            "_key": f"u{i}",
+            "username": f"user{i}",
+            "first_name": random.choice(FIRST_NAMES),
+            "last_name": random.choice(LAST_NAMES),
+            "role": random.choice(ROLES),
+            "phone_number": f"+79{i:09d}",
+            "created_at": random_moment(start, days),
+        }
+
+
+def generate_orders(count, users, products, start, days):
+    for i in range(count):
+        quantity = random.randint(1, 5)
+        yield {
+            "_key": f"o{i}",
+            "customer_id": f"u{random.randrange(users)}",
+            "customer_name": random.choice(LAST_NAMES),
+            "product_id": f"p{random.randrange(products)}",
+            "product_name": "Окно",
+            "quantity": quantity,
+            "total_price": quantity * random.randint(5, 200) * 1000,
+            "status": random.choice(STATUSES),
+            "address": "г. Санкт-Петербург",
+            "created_at": random_moment(start, days),
+        }
+
+
+def generate_measurements(count, users, products, start, days):
+    for i in range(count):
+        done = random.random() < 0.7
+        yield {
+            "_key": f"m{i}",
+            "product_id": f"p{random.randrange(products)}",
+            "user_id": f"u{random.randrange(users)}",
+            "width": round(random.uniform(0.4, 3.0), 2) if done else None,
+            "height": round(random.uniform(0.4, 2.5), 2) if done else None,
+            "created_at": random_moment(start, days),
+        }
+
+
+def generate_photos(count, products, start, days):
+    for i in range(count):
+        yield {
+            "_key": f"ph{i}",
+            "product_id": f"p{random.randrange(products)}",
+            "url": f"/static/photos/{i}.jpg",
+            "created_at": random_moment(start, days),
+        }
+
+
+def import_in_batches(collection, documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            collection.import_bulk(batch, on_duplicate="replace")
+            batch = []
+    if batch:
+        collection.import_bulk(batch, on_duplicate="replace")
+
+
+def seed(db, args):
+    start = datetime(2024, 1, 1)
+    sources = {
+        "products": generate_products(args.products, start, args.days),
+        "users": generate_users(args.users, start, args.days),
+        "orders": generate_orders(args.orders, args.users, args.products, start, args.days),
+        "measurements": generate_measurements(args.measurements, args.users, args.products, start, args.days),
+        "photos": generate_photos(args.photos, args.products, start, args.days),
+    }
+    for name, documents in sources.items():
+        import_in_batches(db.collection(name), documents, args.batch_size)
+    rebuild_rollups(db)
+
+
+def iter_nodes(nodes):
+    """Узлы плана, включая вложенные подзапросы (SubqueryNode в старых версиях ArangoDB)"""
+    for node in nodes:
+        yield node
+        subquery = node.get("subquery")
+        if subquery:
+            yield from iter_nodes(subquery.get("nodes", []))
+
+
+def full_scans(plan):
+    return sorted({node["collection"] for node in iter_nodes(plan.get("nodes", []))
+                   if node.get("type") == "EnumerateCollectionNode" and node.get("collection")})
+
+
+def sorts_before_limit(plan):
+    """Коллекции, строки которых сортируются в памяти (SortNode), а потом обрезаются LIMIT.
+
+    Такой SORT читает все подходящие документы, сколько бы строк ни вернул LIMIT, —
+    значит, подходящего индекса для сортировки нет. Сортировки после COLLECT и по
+    результатам поиска в представлении (BM25) индексом не обслуживаются и не учитываются.
+    """
+    found = set()
+    source = sorted_source = None
+    stack = []
+    for node in iter_nodes(plan.get("nodes", [])):
+        node_type = node.get("type")
+        if node_type in ("EnumerateCollectionNode", "IndexNode"):
+            source = node.get("collection")
+        elif node_type in ("EnumerateViewNode", "EnumerateListNode", "CollectNode"):
+            source = None
+        elif node_type == "SortNode":
+            sorted_source = source
+        elif node_type == "LimitNode" and sorted_source:
+            found.add(sorted_source)
+            sorted_source = None
+        elif node_type == "SubqueryStartNode":
+            stack.append((source, sorted_source))
+            source = sorted_source = None
+        elif node_type == "SubqueryEndNode":
+            source, sorted_source = stack.pop() if stack else (None, None)
+    return sorted(found)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check(db, baseline, args):
+    """EXPLAIN каждой формы запроса; возвращает текущие оценки и список нарушений.
+
+    baseline=None — базовой стоимости нет, проверяются только правила плана.
+    Нарушение — (запрос, [(вид, описание)], узлы плана); вид "plan" — полный просмотр
+    или сортировка в памяти, "cost" — рост стоимости или отсутствие базовой.
+    """
+    sizes = {}
+
+    def size(collection):
+        if collection not in sizes:
+            sizes[collection] = db.collection(collection).count()
+        return sizes[collection]
+
+    costs, problems = {}, []
+    for case in query_cases():
+        plan = db.aql.explain(case.query, bind_vars=case.bind_vars)
+        summary = summarize_plan(plan)
+        cost = summary["estimated_cost"] or 0
+        costs[case.name] = cost
+        notes = []
+
+        for collection in full_scans(plan):
+            if collection in case.full_scans or size(collection) <= args.max_scan_size:
+                continue
+            notes.append(("plan", f"полный просмотр {collection} ({size(collection)} документов)"))
+        for collection in sorts_before_limit(plan):
+            if collection in case.memory_sorts or size(collection) <= args.max_scan_size:
+                continue
+            notes.append(("plan", f"SORT в памяти перед LIMIT по {collection} — индекс не покрывает сортировку"))
+
+        base = baseline.get(case.name) if baseline is not None else None
+        if baseline is not None and base is None:
+            notes.append(("cost", "нет базовой стоимости"))
+        elif base is not None and cost > base * (1 + args.tolerance):
+            notes.append(("cost", f"стоимость {cost:g} выше базовой {base:g} больше чем на {args.tolerance:.0%}"))
+
+        if notes:
+            status = "ОШИБКА"
+            problems.append((case, notes, summary["nodes"]))
+        else:
+            status = "ok"
+
+        base_text = f"{base:g}" if base is not None else "—"
+        print(f"  {case.name:<36} {cost:>12g} {base_text:>12}  {status}")
+    return costs, problems
+
+
+def arango_available(timeout: float = 2) -> bool:
+    """Отвечает ли ArangoDB по первому адресу ARANGO_HOSTS (любой HTTP-ответ, даже 401)"""
+    try:
+        urllib.request.urlopen(f"{ARANGO_HOSTS[0]}/_api/version", timeout=timeout).close()
+    except urllib.error.HTTPError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка планов AQL-запросов WindowShop")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--measurements", type=int, default=3000)
+    parser.add_argument("--photos", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--max-scan-size", type=int, default=1000,
+                        help="полный просмотр коллекции больше этого размера считается ошибкой")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимый рост оценки стоимости относительно базовой (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="записать текущие оценки как базовые")
+    parser.add_argument("--database", default="windowshop_query_plans")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после прогона")
+    return parser.parse_args(argv)
+
+
+def run(args) -> int:
+    """Прогон проверки; возвращает код выхода (1 — есть нарушения)"""
+    baseline = load_baseline(args.baseline)
+    if baseline is None and not args.update_baseline:
+        print(f"[WARN] Нет файла базовой стоимости {args.baseline}: стоимость не сравнивается, "
+              f"проверяются только планы; создайте его запуском с --update-baseline")
+
+    random.seed(42)
+    client = create_client()
+    sys_db = client.db("_system", username=DB_USER, password=DB_PASS)
+    if sys_db.has_database(args.database):
+        sys_db.delete_database(args.database)
+    sys_db.create_database(args.database)
+    db = client.db(args.database, username=DB_USER, password=DB_PASS)
+
+    try:
+        migrate(db)
+        seed(db, args)
+        print(f"{'  запрос':<38} {'стоимость':>12} {'базовая':>12}  статус")
+        costs, problems = check(db, baseline, args)
+    finally:
+        if not args.keep:
+            sys_db.delete_database(args.database)
+
+    for case, notes, nodes in problems:
+        print(f"\n[FAIL] {case.name}: " + "; ".join(text for _, text in notes))
+        print(f"    {' '.join(case.query.split())}")
+        print(f"    план: {' -> '.join(nodes)}")
+
+    stale = sorted(set(baseline or {}) - set(costs))
+    if stale:
+        print(f"\nВ базовой стоимости есть запросы, которых больше нет в реестре: {', '.join(stale)}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(costs, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nБазовая стоимость записана в {args.baseline}")
+        # Новая базовая принимает рост стоимости, но не полный просмотр и не сортировку в памяти
+        problems = [problem for problem in problems if any(kind == "plan" for kind, _ in problem[1])]
+
+    if problems:
+        print(f"\nНарушений: {len(problems)}")
+        return 1
+    print("\nПланы запросов в порядке")
+    return 0
+
+
+def main():
+    sys.exit(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
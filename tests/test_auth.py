@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+
+
+class EpochStore:
+    """Эпохи токенов в "БД"; другой воркер меняет их в обход кэша этого процесса"""
+
+    def __init__(self):
+        self.epochs = {}
+        self.reads = 0
+
+    async def execute(self, query, bind_vars=None, **kwargs):
+        self.reads += 1
+        return [self.epochs.get(bind_vars["key"])]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = EpochStore()
+    monkeypatch.setattr(main.repo, "aql", store)
+    monkeypatch.setattr(main, "AUTH_MODE", "stateless")
+    main.token_epochs.clear()
+    yield store
+    main.token_epochs.clear()
+
+
+def authenticate(user_data):
+    token = main.create_access_token(main.token_claims(user_data))
+    request = SimpleNamespace(cookies={"access_token": token})
+    return asyncio.run(main.get_current_user(request))
+
+
+def user_data(key, role):
+    return {"_key": key, "username": key, "role": role, "token_epoch": 0}
+
+
+def test_revoked_admin_token_rejected_at_once(store):
+    admin = user_data("admin", "admin")
+    store.epochs["admin"] = 0
+    assert authenticate(admin).role == "admin"
+
+    # Роль понижена в другом воркере: эпоха в БД выросла, кэш этого воркера о ней не знает
+    store.epochs["admin"] = 1
+    assert authenticate(admin) is None
+
+
+def test_customer_epoch_cached_for_ttl(store):
+    customer = user_data("customer1", "customer")
+    store.epochs["customer1"] = 0
+    assert authenticate(customer) is not None
+
+    # До TOKEN_EPOCH_CACHE_TTL отозванный токен покупателя ещё проходит проверку
+    store.epochs["customer1"] = 1
+    assert authenticate(customer) is not None
+    assert store.reads == 1
+
+    main.token_epochs.clear()
+    assert authenticate(customer) is None
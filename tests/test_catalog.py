@@ -0,0 +1,37 @@
+import pytest
+
+from app.catalog import decode_catalog_cursor
+from app.pagination import encode_cursor
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("name", ["Окно 100", "p100"]),
+    ("price", [50000, "p900"]),
+    ("-price", [1.5, "p1"]),
+    ("-created_at", [None, "p2"]),
+])
+def test_keyset_cursor(sort, values):
+    assert decode_catalog_cursor(encode_cursor(values), sort) == values
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("price", ["дёшево", "p1"]),
+    ("price", [True, "p1"]),
+    ("name", [{"x": 1}, "p1"]),
+    ("name", ["Окно", None]),
+    ("-created_at", ["2025-01-01", 5]),
+    ("name", ["Окно"]),
+])
+def test_malformed_keyset_cursor(sort, values):
+    with pytest.raises(ValueError):
+        decode_catalog_cursor(encode_cursor(values), sort)
+
+
+def test_relevance_cursor():
+    assert decode_catalog_cursor(encode_cursor([48]), "relevance") == [48]
+
+
+@pytest.mark.parametrize("values", [["x"], [None], [-24], [1.5], [True], [[24]], [24, "p1"]])
+def test_malformed_relevance_cursor(values):
+    with pytest.raises(ValueError):
+        decode_catalog_cursor(encode_cursor(values), "relevance")
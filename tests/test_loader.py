@@ -0,0 +1,57 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from app.loader import StreamingJSONReader, bulk_load
+
+INITIAL_DATA = Path(__file__).resolve().parent.parent / "app" / "data" / "initial_data.json"
+
+
+def expected_documents(text):
+    return [(collection, document)
+            for collection, documents in json.loads(text).items() if isinstance(documents, list)
+            for document in documents]
+
+
+def read_all(text, chunk_size):
+    return list(StreamingJSONReader(io.StringIO(text), chunk_size=chunk_size))
+
+
+@pytest.fixture(scope="module")
+def initial_data():
+    return INITIAL_DATA.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", list(range(1, 65)) + [127, 1000, 4096, 64 * 1024])
+def test_initial_data_any_chunk_size(initial_data, chunk_size):
+    assert read_all(initial_data, chunk_size) == expected_documents(initial_data)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 20))
+def test_values_split_at_chunk_boundary(chunk_size):
+    # Числа, литералы и экранированные строки, разрезанные границей чанка
+    text = '{"a": [12345678, true, null, "x\\"y\\u0439"],\n "skip": {"k": [1]}, "b": [ {"n": -1.5e3} ] }'
+    assert read_all(text, chunk_size) == [("a", 12345678), ("a", True), ("a", None), ("a", 'x"yй'),
+                                          ("b", {"n": -1500.0})]
+
+
+@pytest.mark.parametrize("text", ["{}", "  { }  ", '{"a": []}'])
+def test_empty_collections(text):
+    assert read_all(text, 3) == []
+
+
+@pytest.mark.parametrize("text", ['{"a": [1, 2', '{"a": [1 2]}', '["a"]', '{"a": [{"k": 1}'])
+def test_malformed_input(text):
+    with pytest.raises(ValueError):
+        read_all(text, 4)
+
+
+def test_non_object_entries_are_errors():
+    # До БД такие записи не доходят: ни одной пачки не набирается
+    report = bulk_load(None, [("products", 1), ("products", "окно"), ("orders", None)])
+    assert report.read == 3
+    assert report.errors == 3
+    assert len(report.error_samples) == 3
+    assert report.created == 0
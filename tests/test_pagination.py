@@ -0,0 +1,63 @@
+import base64
+import json
+
+import pytest
+
+from app.pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+
+
+@pytest.mark.parametrize("values", [
+    ["Окно 100", "p100"],
+    [50000, "p900"],
+    [1.5, None],
+    ["2025-02-01T00:00:00", "o500"],
+    ['кавычки " и \\ обратный слэш', "k"],
+])
+def test_cursor_round_trip(values):
+    token = encode_cursor(values)
+    assert "=" not in token
+    assert decode_cursor(token, len(values)) == values
+
+
+@pytest.mark.parametrize("token", [None, ""])
+def test_no_cursor(token):
+    assert decode_cursor(token, 2) is None
+
+
+def _token(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("token", [
+    "!!!",
+    "not-base64-json",
+    _token(b"{not json"),
+    _token(json.dumps({"after": 1}).encode()),
+    _token(json.dumps("p1").encode()),
+    _token(b"\xff\xfe"),
+])
+def test_tampered_cursor(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, 2)
+
+
+def test_cursor_from_other_sort():
+    # Токен сортировки (price, _key) не подходит сортировке по одному значению и наоборот
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([50000, "p900"]), 1)
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([3]), 2)
+
+
+def test_keyset_filter():
+    condition, bind_vars = keyset_filter("p", [("price", "DESC"), ("_key", "DESC")], [5, "a"])
+    assert condition == ("(p.price <= @after0 AND ((p.price < @after0) OR "
+                         "(p.price == @after0 AND p._key < @after1)))")
+    assert bind_vars == {"after0": 5, "after1": "a"}
+
+
+def test_next_cursor():
+    keys = [("name", "ASC"), ("_key", "ASC")]
+    rows = [{"name": f"n{i}", "_key": f"k{i}"} for i in range(3)]
+    assert next_cursor(rows, keys, 3) is None
+    assert decode_cursor(next_cursor(rows, keys, 2), 2) == ["n1", "k1"]
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import check_query_plans  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not check_query_plans.arango_available(),
+                                reason="ArangoDB недоступна (ARANGO_HOSTS)")
+
+
+def test_query_plans():
+    # Отдельная база, чтобы не мешать ручному запуску скрипта; размеры данных — по умолчанию,
+    # иначе оценки стоимости несравнимы с базовыми
+    args = check_query_plans.parse_args(["--database", "windowshop_query_plans_test"])
+    assert check_query_plans.run(args) == 0